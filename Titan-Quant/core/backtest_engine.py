@@ -1,130 +1,283 @@
+import json
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from core.base_strategy import BaseStrategy
+from core.column_buffer import ColumnBuffer
+
+# 列式记录结构 (价格/权益用 float32 足够作图与回撤统计, 成交明细保留 float64)
+EQUITY_COLUMNS = {'time': 'i8', 'equity': 'f4', 'price': 'f4'}
+TRADE_COLUMNS = {
+    'entry_time': 'i8', 'exit_time': 'i8', 'side': 'i1',
+    'entry_price': 'f8', 'exit_price': 'f8', 'pnl': 'f8', 'pnl_pct': 'f8', 'reason': 'i1'
+}
+SIDES = ['LONG', 'SHORT']
+REASONS = ['Stop Loss', 'Take Profit']
+WARMUP_BARS = 50       # 指标预热期, 逐K线模拟从该根开始
+PROGRESS_EVERY = 1000  # 每 N 根K线回调一次进度
+EQUITY_TAIL = 5000     # 续跑状态中保留的权益尾部长度 (用于作图)
+STATE_VERSION = 1
+ENGINE_VERSION = 1      # 撮合/统计口径变化时递增, 使结果缓存失效
 
 class BacktestEngine:
-    def __init__(self, initial_capital=10000, commission=0.0005):
+    def __init__(self, initial_capital=10000, commission=0.0005, record_path=None, fill_resolver=None, slippage_model=None):
         self.initial_capital = initial_capital
         self.commission = commission  # 手续费率 (默认万5)
+        self.record_path = record_path  # 可选: 权益/成交内存映射落盘路径前缀
+        self.fill_resolver = fill_resolver  # 可选: IntrabarResolver, 裁决同K线 SL/TP 双触
+        self.slippage_model = slippage_model  # 可选: DepthSlippage, 按录制盘口修正成交价
         self.reset()
 
-    def reset(self):
+    def reset(self, n_bars=0):
         self.balance = self.initial_capital
-        self.equity_curve = []
-        self.trades = []
+        path = self.record_path
+        # 上一次运行的缓冲区可能映射着同名文件, 先释放再重建
+        for buf in (getattr(self, 'equity_curve', None), getattr(self, 'trades', None)):
+            if buf is not None:
+                buf.close()
+        self.equity_curve = ColumnBuffer(EQUITY_COLUMNS, n_bars, f"{path}.equity" if path else None)
+        self.trades = ColumnBuffer(TRADE_COLUMNS, 256, f"{path}.trades" if path else None)
         self.position = None  # None, 'LONG', 'SHORT'
         self.entry_price = 0
         self.sl = 0
         self.tp = 0
+        self.entry_time = 0
         self.trade_log = []
+        # 续跑时承接的历史权益统计
+        self.equity_peak = None
+        self.carry_drawdown = 0.0
+        self.equity_tail = None
+        self.last_time = None
 
-    def run(self, df: pd.DataFrame, strategy: BaseStrategy):
-        self.reset()
+    def run(self, df: pd.DataFrame, strategy: BaseStrategy, progress_cb=None, state=None):
+        """
+        progress_cb(已完成根数, 总根数): 可选进度回调, 抛出异常即中止回测
+        state: get_state() 的结果; 传入时 df 必须为 完整旧数据+新追加数据 (不能只传尾部窗口),
+               指标仍按全量重算 (向量化, 与完整重跑一致), 逐K线模拟只跑新增部分
+        """
         # 1. 预计算指标
         df = strategy.add_indicators(df.copy())
-        
+        times = df['time'].to_numpy(dtype='datetime64[ns]').view('i8')
+
+        start = WARMUP_BARS
+        if state:
+            start = int(np.searchsorted(times, state['last_time'], side='right'))
+            if state['last_time'] not in times[:start]:
+                raise ValueError("续跑数据与回测状态不连续 (缺少上次的最后一根K线)")
+            if start <= WARMUP_BARS:
+                # 截断的历史既会跳过新K线, 指标也与完整重跑不同
+                raise ValueError(f"续跑数据历史不足: 上次最后一根K线之前只有 {start - 1} 根, 需传入完整历史")
+        self.reset(max(len(df) - start, 0))
+        if state:
+            self._restore(state)
+
+        # 热循环只读原生数组, 避免逐行构造 Series
+        highs = df['high'].to_numpy(dtype='f8')
+        lows = df['low'].to_numpy(dtype='f8')
+        closes = df['close'].to_numpy(dtype='f8')
+        record_equity = self.equity_curve.append
+        record_trade = self.trades.append
+        slippage = self.slippage_model
+        # 收盘价开仓的成交时刻 = 下一根K线开盘
+        bar_ns = int(np.median(np.diff(times))) if slippage and len(times) > 1 else 0
+
         # 2. 逐K线回测 (Bar-by-Bar)
-        # 从第50根开始，给指标留出预热期
-        for i in range(50, len(df)):
-            current_bar = df.iloc[i]
-            prev_bar = df.iloc[i-1]
-            timestamp = current_bar['time']
-            close_price = current_bar['close']
-            
+        # 从第 WARMUP_BARS 根开始，给指标留出预热期
+        n_bars = len(df) - start
+        for i in range(start, len(df)):
+            if progress_cb and i % PROGRESS_EVERY == 0:
+                progress_cb(i - start, n_bars)
+            timestamp = times[i]
+            close_price = closes[i]
+
             # --- 记录权益 ---
             unrealized_pnl = 0
             if self.position == 'LONG':
                 unrealized_pnl = (close_price - self.entry_price) / self.entry_price * self.balance
             elif self.position == 'SHORT':
                 unrealized_pnl = (self.entry_price - close_price) / self.entry_price * self.balance
-            
-            self.equity_curve.append({
-                'time': timestamp,
-                'equity': self.balance + unrealized_pnl,
-                'price': close_price
-            })
+
+            record_equity(timestamp, self.balance + unrealized_pnl, close_price)
 
             # --- 平仓逻辑 (止盈/止损) ---
             if self.position:
                 exit_price = None
-                pnl = 0
-                reason = ""
-                
+                reason = 0
+
                 # 检查是否触发 SL/TP (使用 High/Low 模拟盘中触达)
                 if self.position == 'LONG':
-                    if current_bar['low'] <= self.sl:
-                        exit_price = self.sl
-                        reason = "Stop Loss"
-                    elif current_bar['high'] >= self.tp:
-                        exit_price = self.tp
-                        reason = "Take Profit"
-                elif self.position == 'SHORT':
-                    if current_bar['high'] >= self.sl:
-                        exit_price = self.sl
-                        reason = "Stop Loss"
-                    elif current_bar['low'] <= self.tp:
-                        exit_price = self.tp
-                        reason = "Take Profit"
-                
+                    hit_sl, hit_tp = lows[i] <= self.sl, highs[i] >= self.tp
+                else:
+                    hit_sl, hit_tp = highs[i] >= self.sl, lows[i] <= self.tp
+
+                # 双触: 默认保守按止损先触发, 配置了高精度撮合则下钻低周期K线
+                if hit_sl and hit_tp and self.fill_resolver:
+                    hit_sl = self.fill_resolver.stop_first(timestamp, self.position, self.sl, self.tp)
+
+                if hit_sl:
+                    exit_price = self.sl
+                    reason = 0
+                elif hit_tp:
+                    exit_price = self.tp
+                    reason = 1
+
                 # 执行平仓
                 if exit_price:
+                    if slippage:
+                        exit_price = slippage.fill_price(timestamp, 'sell' if self.position == 'LONG' else 'buy',
+                                                         self.balance / self.entry_price, exit_price)
                     # 计算盈亏 (扣除双边手续费)
                     trade_pnl_pct = (exit_price - self.entry_price) / self.entry_price if self.position == 'LONG' else (self.entry_price - exit_price) / self.entry_price
                     fee_cost = self.commission * 2
                     realized_pnl = self.balance * (trade_pnl_pct - fee_cost)
-                    
+
                     self.balance += realized_pnl
-                    self.trades.append({
-                        'entry_time': self.entry_time,
-                        'exit_time': timestamp,
-                        'side': self.position,
-                        'entry_price': self.entry_price,
-                        'exit_price': exit_price,
-                        'pnl': realized_pnl,
-                        'pnl_pct': trade_pnl_pct * 100,
-                        'reason': reason
-                    })
+                    record_trade(self.entry_time, timestamp, SIDES.index(self.position),
+                                 self.entry_price, exit_price, realized_pnl, trade_pnl_pct * 100, reason)
                     self.position = None
 
             # --- 开仓逻辑 ---
             if self.position is None:
                 # 调用策略获取信号
                 signal_data = strategy.on_bar(df, i)
-                
+
                 if signal_data['signal'] in ['LONG', 'SHORT']:
                     self.position = signal_data['signal']
                     self.entry_price = close_price
+                    if slippage:
+                        self.entry_price = slippage.fill_price(timestamp + bar_ns, 'buy' if self.position == 'LONG' else 'sell',
+                                                               self.balance / close_price, close_price)
                     self.entry_time = timestamp
                     self.sl = signal_data['stop_loss']
                     self.tp = signal_data['take_profit']
-        
+
+        if len(df) > start:
+            self.last_time = int(times[-1])
+        self.equity_curve.flush()
+        self.trades.flush()
         return self._generate_report()
 
+    def get_state(self):
+        """导出回测终态 (可 JSON 序列化), 供新K线到来后续跑"""
+        if self.last_time is None:
+            raise ValueError("尚未运行回测")
+        equity = self.equity_curve.column('equity').astype('f8')
+        peak, drawdown = self._drawdown(equity)
+        tail = self.equity_frame().tail(EQUITY_TAIL)
+        return {
+            "version": STATE_VERSION,
+            "initial_capital": self.initial_capital,
+            "commission": self.commission,
+            "balance": self.balance,
+            "position": self.position,
+            "entry_price": float(self.entry_price),
+            "entry_time": int(self.entry_time),
+            "sl": float(self.sl),
+            "tp": float(self.tp),
+            "last_time": self.last_time,
+            "equity_peak": float(peak[-1]) if len(peak) else self.equity_peak,
+            "max_drawdown": float(min(drawdown.min(), self.carry_drawdown)) if len(drawdown) else self.carry_drawdown,
+            "trades": {name: self.trades.column(name).tolist() for name in TRADE_COLUMNS},
+            "equity_tail": {
+                "time": tail['time'].to_numpy(dtype='datetime64[ns]').view('i8').tolist(),
+                "equity": tail['equity'].tolist(),
+                "price": tail['price'].tolist()
+            }
+        }
+
+    def _restore(self, state):
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"不支持的回测状态版本: {state.get('version')}")
+        self.initial_capital = state['initial_capital']
+        self.commission = state['commission']
+        self.balance = state['balance']
+        self.position = state['position']
+        self.entry_price = state['entry_price']
+        self.entry_time = state['entry_time']
+        self.sl = state['sl']
+        self.tp = state['tp']
+        self.last_time = state['last_time']
+        self.equity_peak = state['equity_peak']
+        self.carry_drawdown = state['max_drawdown']
+        self.equity_tail = state['equity_tail']
+        trades = state['trades']
+        for row in zip(*(trades[name] for name in TRADE_COLUMNS)):
+            self.trades.append(*row)
+
+    def save_state(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_state(), f)
+
+    @staticmethod
+    def load_state(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def trades_frame(self):
+        """成交明细 DataFrame (按列一次性构造)"""
+        t = self.trades
+        return pd.DataFrame({
+            'entry_time': t.column('entry_time').view('datetime64[ns]'),
+            'exit_time': t.column('exit_time').view('datetime64[ns]'),
+            'side': pd.Categorical.from_codes(t.column('side'), SIDES),
+            'entry_price': t.column('entry_price'),
+            'exit_price': t.column('exit_price'),
+            'pnl': t.column('pnl'),
+            'pnl_pct': t.column('pnl_pct'),
+            'reason': pd.Categorical.from_codes(t.column('reason'), REASONS)
+        })
+
+    def equity_frame(self):
+        e = self.equity_curve
+        df = pd.DataFrame({
+            'time': e.column('time').view('datetime64[ns]'),
+            'equity': e.column('equity'),
+            'price': e.column('price')
+        })
+        if self.equity_tail:
+            # 续跑: 拼接上次保留的权益尾部
+            tail = self.equity_tail
+            prev = pd.DataFrame({
+                'time': np.array(tail['time'], dtype='i8').view('datetime64[ns]'),
+                'equity': np.array(tail['equity'], dtype='f4'),
+                'price': np.array(tail['price'], dtype='f4')
+            })
+            df = pd.concat([prev, df], ignore_index=True)
+        return df
+
+    def _drawdown(self, equity):
+        """逐点回撤; 续跑时以历史峰值作为起点"""
+        if self.equity_peak is not None:
+            rolling_max = np.maximum.accumulate(np.r_[self.equity_peak, equity])[1:]
+        else:
+            rolling_max = np.maximum.accumulate(equity)
+        return rolling_max, (equity - rolling_max) / rolling_max
+
     def _generate_report(self):
-        trades_df = pd.DataFrame(self.trades)
-        equity_df = pd.DataFrame(self.equity_curve)
-        
-        if trades_df.empty:
+        # 指标直接由列数组计算, DataFrame 仅供展示
+        trades_df = self.trades_frame()
+        equity_df = self.equity_frame()
+
+        if len(self.trades) == 0:
             return {"error": "无交易产生", "equity": equity_df, "trades": trades_df}
 
         # 核心指标计算
-        total_trades = len(trades_df)
-        wins = trades_df[trades_df['pnl'] > 0]
-        losses = trades_df[trades_df['pnl'] <= 0]
+        pnl = self.trades.column('pnl')
+        total_trades = len(pnl)
+        wins = pnl[pnl > 0]
+        losses = pnl[pnl <= 0]
         win_rate = len(wins) / total_trades * 100
-        
-        avg_win = wins['pnl'].mean() if not wins.empty else 0
-        avg_loss = abs(losses['pnl'].mean()) if not losses.empty else 1
+
+        avg_win = wins.mean() if len(wins) else 0
+        avg_loss = abs(losses.mean()) if len(losses) else 1
         profit_factor = avg_win / avg_loss
-        
+
         total_return = (self.balance - self.initial_capital) / self.initial_capital * 100
-        
+
         # 最大回撤计算
-        equity_series = equity_df['equity']
-        rolling_max = equity_series.cummax()
-        drawdown = (equity_series - rolling_max) / rolling_max
-        max_drawdown = drawdown.min() * 100
+        equity = self.equity_curve.column('equity').astype('f8')
+        _, drawdown = self._drawdown(equity)
+        max_drawdown = min(drawdown.min() if len(drawdown) else 0, self.carry_drawdown) * 100
 
         return {
             "initial_capital": self.initial_capital,
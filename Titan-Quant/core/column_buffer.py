@@ -0,0 +1,82 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+class ColumnBuffer:
+    """
+    预分配的列式缓冲区
+    每列一个 NumPy 数组, 容量不足时按倍数扩容;
+    指定 path 时每列落盘为 {path}.{列名}.npy 的内存映射文件, 适合超长回测
+    """
+    def __init__(self, columns, capacity=1024, path=None):
+        self.columns = columns  # {列名: dtype}, 顺序即 append 参数顺序
+        self.capacity = max(int(capacity), 1)
+        self.path = path
+        self.size = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.arrays = {name: self._alloc(name, dtype, self.capacity) for name, dtype in columns.items()}
+        self._cols = list(self.arrays.values())
+
+    def _file(self, name):
+        return f"{self.path}.{name}.npy"
+
+    def _alloc(self, name, dtype, capacity):
+        if self.path:
+            return np.lib.format.open_memmap(self._file(name), mode='w+', dtype=dtype, shape=(capacity,))
+        return np.empty(capacity, dtype=dtype)
+
+    def _grow(self):
+        new_cap = self.capacity * 2
+        self._cols = []
+        for name, dtype in self.columns.items():
+            old = self.arrays.pop(name)
+            if self.path:
+                # 内存映射文件无法原地扩容: 写入新文件后替换
+                tmp = self._file(name) + '.tmp'
+                new = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=(new_cap,))
+                new[:self.size] = old[:self.size]
+                new.flush()
+                del old, new  # 先释放映射, Windows 下才能替换文件
+                os.replace(tmp, self._file(name))
+                new = np.load(self._file(name), mmap_mode='r+')
+            else:
+                new = np.empty(new_cap, dtype=dtype)
+                new[:self.size] = old[:self.size]
+            self.arrays[name] = new
+        self.capacity = new_cap
+        self._cols = [self.arrays[name] for name in self.columns]
+
+    def append(self, *values):
+        if self.size == self.capacity:
+            self._grow()
+        i = self.size
+        for arr, v in zip(self._cols, values):
+            arr[i] = v
+        self.size += 1
+
+    def column(self, name):
+        """返回有效部分的视图 (不复制)"""
+        return self.arrays[name][:self.size]
+
+    def flush(self):
+        """落盘, 并记录有效行数 ({path}.json)"""
+        if self.path:
+            for arr in self._cols:
+                arr.flush()
+            with open(f"{self.path}.json", 'w', encoding='utf-8') as f:
+                json.dump({"size": self.size, "columns": list(self.columns)}, f)
+
+    def close(self):
+        """落盘并释放内存映射; 同一路径以 'w+' 重新打开前必须调用 (Windows 下映射中的文件无法重建)"""
+        self.flush()
+        self.arrays = {}
+        self._cols = []
+
+    def __len__(self):
+        return self.size
+
+    def to_frame(self):
+        return pd.DataFrame({name: self.column(name) for name in self.columns})
@@ -1,12 +1,19 @@
 import ccxt
+import logging
 import pandas as pd
 import pandas_ta as ta
 import plotly.graph_objects as go
+from core.rate_limiter import get_limiter, request_weight, PRIORITY_LIVE, PRIORITY_ORDER
+from core.downsample import downsample_ohlc, MAX_POINTS
+
+# 经 log_pipeline 的队列写出, 不在扫描/下单线程里同步写 stdout
+log = logging.getLogger(__name__)
 
 class DataEngine:
-    def __init__(self, exchange_name, config, secrets):
+    def __init__(self, exchange_name, config, secrets, priority=PRIORITY_LIVE):
         self.name = exchange_name
         self.type = config.get('type', 'ccxt')
+        self.priority = priority
         
         # 初始化交易所
         if self.type == 'ccxt':
@@ -23,11 +30,29 @@ class DataEngine:
                 'enableRateLimit': True,
                 'options': {'defaultType': 'future'}
             })
+            # 跨进程共享限流 (同一 IP 下所有进程共用权重)
+            self.limiter = get_limiter(ex_id, **config.get('rate_limit', {}))
+
+    def _call(self, method, *args, priority=None, weight=None, **kwargs):
+        """经由共享限流器调用交易所接口"""
+        priority = self.priority if priority is None else priority
+        weight = weight or request_weight(method, kwargs.get('limit'))
+        self.limiter.acquire(weight, priority)
+        try:
+            result = getattr(self.client, method)(*args, **kwargs)
+        except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
+            # 429 / 418: 通知所有进程一起退避
+            self.limiter.penalize(60)
+            raise
+        used = (self.client.last_response_headers or {}).get('X-MBX-USED-WEIGHT-1M')
+        if used:
+            self.limiter.observe(used)
+        return result
 
     def fetch_ohlcv(self, symbol, timeframe, limit=100):
         try:
             # 如果是公开数据，不需要签名
-            bars = self.client.fetch_ohlcv(symbol, timeframe, limit=limit)
+            bars = self._call('fetch_ohlcv', symbol, timeframe, limit=limit)
             df = pd.DataFrame(bars, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
             df['time'] = pd.to_datetime(df['time'], unit='ms')
             
@@ -41,43 +66,74 @@ class DataEngine:
             
             return df
         except Exception as e:
-            print(f"数据获取失败 [{self.name}]: {e}")
+            log.warning("数据获取失败 [%s]: %s", self.name, e)
+            return None
+
+    def fetch_range(self, symbol, timeframe, since, limit=1000):
+        """按起始时间 (ms) 拉取原始K线, 不计算指标"""
+        try:
+            bars = self._call('fetch_ohlcv', symbol, timeframe, since=since, limit=limit)
+            df = pd.DataFrame(bars, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
+            df['time'] = pd.to_datetime(df['time'], unit='ms')
+            return df
+        except Exception as e:
+            log.warning("数据获取失败 [%s]: %s", self.name, e)
             return None
 
     def execute_order(self, symbol, side, qty, params={}):
         if not self.client.apiKey:
-            print("❌ 无法下单: 未配置 API Key")
+            log.error("❌ 无法下单: 未配置 API Key")
             return None
         try:
-            return self.client.create_market_order(symbol, side, qty, params)
+            return self._call('create_market_order', symbol, side, qty, params, priority=PRIORITY_ORDER)
         except Exception as e:
-            print(f"❌ 下单报错: {e}")
+            log.error("❌ 下单报错: %s", e)
             return None
 
     def close_all(self, symbol):
         if not self.client.apiKey: return "无 Key"
         try:
-            positions = self.client.fetch_positions([symbol])
+            positions = self._call('fetch_positions', [symbol], priority=PRIORITY_ORDER)
             count = 0
             for p in positions:
                 amt = float(p['contracts'])
                 if amt > 0:
                     side = 'sell' if p['side'] == 'long' else 'buy'
-                    self.client.create_market_order(symbol, side, amt)
+                    self._call('create_market_order', symbol, side, amt, priority=PRIORITY_ORDER)
                     count += 1
             return f"已平仓 {count} 单"
         except Exception as e:
             return f"平仓失败: {e}"
 
+    def fetch_balance(self):
+        return self._call('fetch_balance')
+
+    def fetch_positions(self, symbols=None):
+        return self._call('fetch_positions', symbols)
+
+    def fetch_order_book(self, symbol, limit=100):
+        return self._call('fetch_order_book', symbol, limit=limit)
+
     @staticmethod
-    def plot_chart(df, symbol):
+    def plot_chart(df, symbol, max_points=MAX_POINTS, trades=None):
+        """
+        服务端降采样后作图, 点数不随历史长度增长
+        trades: 可选成交明细 (entry_time/exit_time/entry_price/exit_price), 标记不参与降采样
+        """
         if df is None or df.empty: return None
+        df = downsample_ohlc(df, max_points)
         
         fig = go.Figure(data=[go.Candlestick(x=df['time'],
                         open=df['open'], high=df['high'],
                         low=df['low'], close=df['close'], name='Price')])
         
         fig.add_trace(go.Scatter(x=df['time'], y=df['ema50'], line=dict(color='#FFA500', width=1), name='EMA 50'))
+
+        if trades is not None and not trades.empty:
+            fig.add_trace(go.Scatter(x=trades['entry_time'], y=trades['entry_price'], mode='markers', name='开仓',
+                                     marker=dict(symbol='triangle-up', size=9, color='#00bcd4')))
+            fig.add_trace(go.Scatter(x=trades['exit_time'], y=trades['exit_price'], mode='markers', name='平仓',
+                                     marker=dict(symbol='x', size=8, color='#ff5252')))
         
         fig.update_layout(
             title=f'{symbol} Live (v5.5)',
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 2000  # 单个视窗发送给浏览器的点数上限
+
+
+def lttb_indices(y, n_out, x=None):
+    """Largest-Triangle-Three-Buckets: 返回保留点的下标 (首尾必保留)"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype='f8') if x is None else np.asarray(x, dtype='f8')
+    y = np.asarray(y, dtype='f8')
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # 中间 n_out-2 个桶的边界
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = edges[k], edges[k + 1]
+        nlo, nhi = hi, (edges[k + 2] if k + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[k + 1] = a
+    return out
+
+def _time_values(s):
+    return s.to_numpy(dtype='datetime64[ns]').view('i8')
+
+def downsample_line(df, y_col, max_points=MAX_POINTS, time_col='time', keep_times=None):
+    """折线 LTTB 降采样; keep_times 中的时间点 (如成交) 强制保留"""
+    if len(df) <= max_points:
+        return df
+    x = _time_values(df[time_col])
+    keep = np.empty(0, dtype=np.int64)
+    if keep_times is not None and len(keep_times):
+        keep = np.unique(np.clip(np.searchsorted(x, _time_values(pd.Series(keep_times))), 0, len(df) - 1))
+    # 强制保留的点占用配额, 总点数仍不超过上限 (保留点本身超限时除外)
+    idx = lttb_indices(df[y_col].to_numpy(), max(max_points - len(keep), 3), x)
+    return df.iloc[np.union1d(idx, keep)]
+
+def downsample_ohlc(df, max_points=MAX_POINTS):
+    """K线按位置分桶聚合: 开=首, 高=最大, 低=最小, 收=末, 量=合计, 其余列 (指标) 取末值"""
+    n = len(df)
+    if n <= max_points:
+        return df
+    starts = np.unique(np.linspace(0, n, max_points + 1).astype(np.int64)[:-1])
+    ends = np.r_[starts[1:], n] - 1
+    out = {}
+    for col in df.columns:
+        v = df[col].to_numpy()
+        if col == 'time' or col == 'open':
+            out[col] = v[starts]
+        elif col == 'high':
+            out[col] = np.maximum.reduceat(v, starts)
+        elif col == 'low':
+            out[col] = np.minimum.reduceat(v, starts)
+        elif col == 'volume':
+            out[col] = np.add.reduceat(v, starts)
+        else:
+            out[col] = v[ends]
+    return pd.DataFrame(out)
+
+def visible_window(df, start=None, end=None, time_col='time'):
+    """截取可视区间 (缩放时按新区间重新降采样以获得细节)"""
+    x = _time_values(df[time_col])
+    lo = 0 if start is None else np.searchsorted(x, pd.Timestamp(start).value, side='left')
+    hi = len(df) if end is None else np.searchsorted(x, pd.Timestamp(end).value, side='right')
+    return df.iloc[lo:hi]
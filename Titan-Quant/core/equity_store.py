@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import queue
+import logging
+import sqlite3
+import threading
+import pandas as pd
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EQUITY_DB = os.path.join(BASE_DIR, 'data', 'equity.db')
+
+# 预聚合粒度 (秒)
+ROLLUPS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+log = logging.getLogger(__name__)
+
+
+class EquityStore:
+    """
+    账户权益时间序列
+    原始快照只追加; 写入时同步更新 1m/1h/1d 权益 OHLC,
+    查询时按可视区间自动选择粒度, 返回点数有上限
+    start() 后 record 只做一次 put_nowait, 由后台线程批量写库 (一个事务一次 commit)
+    """
+    def __init__(self, db_path=EQUITY_DB, raw_interval=10, queue_size=10000):
+        self.db_path = db_path
+        self.raw_interval = raw_interval  # 快照间隔 (main.py 的 check_interval), 用于估算原始点数
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._thread = None
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")  # 控制台读取不阻塞后端写入
+        conn.execute("""CREATE TABLE IF NOT EXISTS equity_snapshots
+                     (ts REAL,
+                      account TEXT,
+                      balance REAL,
+                      upnl REAL,
+                      equity REAL,
+                      positions TEXT)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_snap_account_ts ON equity_snapshots (account, ts)")
+        conn.execute("""CREATE TABLE IF NOT EXISTS equity_rollups
+                     (resolution TEXT,
+                      account TEXT,
+                      bucket INTEGER,
+                      open REAL,
+                      high REAL,
+                      low REAL,
+                      close REAL,
+                      n INTEGER,
+                      PRIMARY KEY (resolution, account, bucket))""")
+        conn.close()
+
+    def _conn(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='equity-writer')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """写完队列中剩余快照"""
+        if self._thread:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def record(self, account, balance, upnl=0.0, positions=None, ts=None):
+        """记录一次快照; 已 start() 时只入队 (队列满则丢弃计数), 否则同步写入"""
+        row = (ts or time.time(), account, balance, upnl, positions)
+        if self._thread is None:
+            self._write([row])
+            return
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        running = True
+        while running:
+            rows = [self.queue.get()]
+            while True:
+                try:
+                    rows.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in rows:
+                running = False
+                rows = [r for r in rows if r is not None]
+            if not rows:
+                continue
+            try:
+                self._write(rows)
+            except sqlite3.Error as e:
+                log.warning("权益快照写入失败 (%d 条): %s", len(rows), e)
+
+    def _write(self, rows):
+        snapshots, rollups = [], []
+        for ts, account, balance, upnl, positions in rows:
+            equity = balance + upnl
+            snapshots.append((ts, account, balance, upnl, equity, json.dumps(positions or [])))
+            for res, secs in ROLLUPS.items():
+                rollups.append((res, account, int(ts // secs) * secs, equity, equity, equity, equity))
+        conn = self._conn()
+        try:
+            conn.executemany("INSERT INTO equity_snapshots VALUES (?, ?, ?, ?, ?, ?)", snapshots)
+            conn.executemany("""INSERT INTO equity_rollups VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                             ON CONFLICT (resolution, account, bucket) DO UPDATE SET
+                             high=MAX(high, excluded.high), low=MIN(low, excluded.low), close=excluded.close, n=n+1""",
+                             rollups)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def pick_resolution(self, start, end, max_points):
+        """满足点数上限的最细粒度; 'raw' 表示原始快照"""
+        span = max(end - start, 1)
+        if span / self.raw_interval <= max_points:
+            return 'raw'
+        for res, secs in ROLLUPS.items():
+            if span / secs <= max_points:
+                return res
+        return '1d'
+
+    def query(self, account, start=None, end=None, max_points=1500):
+        """返回 (粒度, DataFrame[time, open, high, low, close])"""
+        end = end or time.time()
+        if start is None:
+            conn = self._conn()
+            first = conn.execute("SELECT MIN(bucket) FROM equity_rollups WHERE resolution='1d' AND account=?", (account,)).fetchone()[0]
+            conn.close()
+            start = first if first is not None else end - 86400
+
+        res = self.pick_resolution(start, end, max_points)
+        conn = self._conn()
+        if res == 'raw':
+            df = pd.read_sql_query("SELECT ts AS time, equity AS open, equity AS high, equity AS low, equity AS close FROM equity_snapshots WHERE account=? AND ts>=? AND ts<=? ORDER BY ts",
+                                   conn, params=(account, start, end))
+        else:
+            df = pd.read_sql_query("SELECT bucket AS time, open, high, low, close FROM equity_rollups WHERE resolution=? AND account=? AND bucket>=? AND bucket<=? ORDER BY bucket",
+                                   conn, params=(res, account, int(start // ROLLUPS[res]) * ROLLUPS[res], end))
+        conn.close()
+        df['time'] = pd.to_datetime(df['time'], unit='s')
+        return res, df
+
+    def latest(self, account):
+        conn = self._conn()
+        row = conn.execute("SELECT ts, balance, upnl, equity, positions FROM equity_snapshots WHERE account=? ORDER BY ts DESC LIMIT 1", (account,)).fetchone()
+        conn.close()
+        if not row: return None
+        return {"ts": row[0], "balance": row[1], "upnl": row[2], "equity": row[3], "positions": json.loads(row[4])}
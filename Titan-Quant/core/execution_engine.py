@@ -1,9 +1,31 @@
+import time
+import logging
+from core.rate_limiter import request_weight, PRIORITY_ORDER
+from core.order_book import OrderBook
+
+BALANCE_TTL = 30  # 余额缓存有效期 (秒), 下单时不再额外请求一次余额
+POSITION_TTL = 15  # 持仓状态有效期 (秒), 扫描间隙已同步过则下单前不再请求
+
+# 下单在路由线程中执行: 经 log_pipeline 的队列写出, 不阻塞在 stdout 上
+log = logging.getLogger(__name__)
+
 class ExecutionEngine:
-    def __init__(self, exchange_instance, symbol, leverage=20, risk_per_trade=0.018):
+    def __init__(self, exchange_instance, symbol, leverage=20, risk_per_trade=0.018, limiter=None,
+                 max_slippage=None, book_depth=100, account=None):
         self.ex = exchange_instance
         self.symbol = symbol
         self.leverage = leverage
         self.risk = risk_per_trade
+        self.limiter = limiter  # 可选: 跨进程共享限流器
+        # 多账户共用一个限流器时, 各账户以独立身份排队
+        self.waiter_id = limiter.waiter_for(account or id(self)) if limiter else None
+        self.balance = None
+        self.balance_ts = 0
+        self.position_ts = 0
+        self.leverage_set = {}  # {symbol: 已设置的杠杆}
+        self.max_slippage = max_slippage  # 可选: 开仓均价相对最优价的最大偏离, 按盘口深度限制仓位
+        self.book_depth = book_depth
+        self.book = OrderBook(symbol, depth=book_depth)
         self.position_state = {
             "status": "idle",
             "side": None,
@@ -12,6 +34,35 @@ class ExecutionEngine:
             "take_profit": 0
         }
 
+    def _throttle(self, method):
+        if self.limiter:
+            self.limiter.acquire(request_weight(method), PRIORITY_ORDER, waiter=self.waiter_id)
+
+    def refresh_balance(self, max_age=BALANCE_TTL):
+        """返回缓存余额, 过期才重新拉取"""
+        if self.balance is None or time.time() - self.balance_ts > max_age:
+            self._throttle('fetch_balance')
+            self.balance = self.ex.fetch_balance()['USDT']['free']
+            self.balance_ts = time.time()
+        return self.balance
+
+    def ensure_leverage(self):
+        """每个品种只设置一次杠杆, 之后下单不再请求"""
+        if self.leverage_set.get(self.symbol) == self.leverage:
+            return
+        try:
+            self._throttle('set_leverage')
+            self.ex.set_leverage(self.leverage, self.symbol)
+            self.leverage_set[self.symbol] = self.leverage
+        except:
+            pass # 部分交易所可能不支持或是全仓模式
+
+    def refresh_book(self):
+        """拉取盘口快照到本地 OrderBook"""
+        self._throttle('fetch_order_book')
+        self.book.apply(self.ex.fetch_order_book(self.symbol, limit=self.book_depth))
+        return self.book
+
     def calc_size(self, balance, entry, sl):
         dist = abs(entry - sl)
         if dist == 0: return 0
@@ -22,31 +73,38 @@ class ExecutionEngine:
         if qty * entry < 110: qty = 110 / entry
         # 最大杠杆修正
         if qty * entry > balance * self.leverage: qty = (balance * self.leverage) / entry
+        # 盘口深度修正: 吃单均价偏离不超过 max_slippage, 不足最小名义价值则放弃
+        if self.max_slippage and self.book.ready:
+            qty = min(qty, self.book.max_qty('buy' if entry > sl else 'sell', self.max_slippage))
+            if qty * entry < 110: return 0
         
         return self.ex.amount_to_precision(self.symbol, qty)
 
     def execute_signal(self, signal_dict):
+        """返回 {'ok': bool, 'qty', 'order', 'error'}"""
         if self.position_state['status'] != 'idle':
-            return 
+            return {"ok": False, "qty": 0, "order": None, "error": "已有持仓"}
 
         sig = signal_dict['signal']
-        if not sig: return
+        if not sig: return {"ok": False, "qty": 0, "order": None, "error": "无信号"}
 
         try:
-            # 1. 设置杠杆
-            try:
-                self.ex.set_leverage(self.leverage, self.symbol)
-            except:
-                pass # 部分交易所可能不支持或是全仓模式
+            # 1. 设置杠杆 (已设置过则跳过)
+            self.ensure_leverage()
             
-            # 2. 计算仓位
-            bal = self.ex.fetch_balance()['USDT']['free']
+            # 2. 计算仓位 (使用缓存余额)
+            bal = self.refresh_balance()
+            if self.max_slippage:
+                self.refresh_book()
             qty = self.calc_size(bal, signal_dict['entry_price'], signal_dict['stop_loss'])
+            if not float(qty):
+                return {"ok": False, "qty": 0, "order": None, "error": "仓位为 0 (止损距离为 0 或盘口深度不足)"}
             
-            print(f"🚀 尝试开单: {sig} {qty}...")
+            log.info("🚀 尝试开单: %s %s...", sig, qty, extra={'symbol': self.symbol, 'stage': 'order', 'signal': sig})
             
             # 3. 市价开单
             side = 'buy' if sig == 'LONG' else 'sell'
+            self._throttle('create_market_order')
             order = self.ex.create_market_order(self.symbol, side, float(qty))
             
             # 4. 挂止损止盈
@@ -54,7 +112,9 @@ class ExecutionEngine:
             tp_price = signal_dict['take_profit']
             opp_side = 'sell' if side == 'buy' else 'buy'
             
+            self._throttle('create_order')
             self.ex.create_order(self.symbol, 'STOP_MARKET', opp_side, float(qty), params={'stopPrice': sl_price})
+            self._throttle('create_order')
             self.ex.create_order(self.symbol, 'TAKE_PROFIT_MARKET', opp_side, float(qty), params={'stopPrice': tp_price})
 
             # 更新状态
@@ -65,14 +125,21 @@ class ExecutionEngine:
                 "stop_loss": sl_price,
                 "take_profit": tp_price
             }
-            print(f"✅ 开单成功! SL:{sl_price} TP:{tp_price}")
+            self.position_ts = time.time()
+            self.balance_ts = 0  # 保证金已变化, 下次重新拉取
+            log.info("✅ 开单成功! SL:%s TP:%s", sl_price, tp_price, extra={'symbol': self.symbol, 'stage': 'order', 'signal': sig})
+            return {"ok": True, "qty": float(qty), "order": order, "error": None}
             
         except Exception as e:
-            print(f"❌ 下单异常: {e}")
+            log.error("❌ 下单异常: %s", e, extra={'symbol': self.symbol, 'stage': 'order', 'signal': sig})
+            return {"ok": False, "qty": 0, "order": None, "error": str(e)}
 
-    def sync_position(self):
-        """同步链上持仓状态"""
+    def sync_position(self, max_age=0):
+        """同步链上持仓状态; 距上次同步不超过 max_age 秒时沿用本地状态"""
+        if max_age and time.time() - self.position_ts <= max_age:
+            return
         try:
+            self._throttle('fetch_positions')
             positions = self.ex.fetch_positions([self.symbol])
             active = [p for p in positions if float(p['contracts']) > 0]
             if not active:
@@ -82,5 +149,6 @@ class ExecutionEngine:
                 self.position_state['status'] = 'in_position'
                 self.position_state['side'] = 'LONG' if p['side'] == 'long' else 'SHORT'
                 self.position_state['entry_price'] = float(p['entryPrice'])
+            self.position_ts = time.time()
         except Exception as e:
-            print(f"同步失败: {e}")
+            log.warning("同步失败: %s", e, extra={'symbol': self.symbol, 'stage': 'sync'})
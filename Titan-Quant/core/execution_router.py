@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from core.data_engine import DataEngine
+from core.execution_engine import ExecutionEngine, POSITION_TTL
+from core.rate_limiter import PRIORITY_ORDER
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACCOUNTS_FILE = os.path.join(BASE_DIR, 'config', 'exchanges.json')
+
+log = logging.getLogger(__name__)
+
+
+class ExecutionRouter:
+    """
+    多账户执行路由: 同一信号并发下发到 N 个账户
+    每个账户独立按自身缓存余额计算仓位, 结果按账户汇总
+    """
+    def __init__(self, engines, max_workers=None):
+        self.engines = engines  # {账户名: ExecutionEngine}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or max(len(engines), 1), thread_name_prefix='exec')
+
+    def _map(self, fn):
+        """对所有账户并发执行 fn(engine), 返回 {账户名: 结果}"""
+        futures = {name: self.pool.submit(fn, eng) for name, eng in self.engines.items()}
+        results = {}
+        for name, fut in futures.items():
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                results[name] = {"ok": False, "error": str(e)}
+        return results
+
+    def refresh_accounts(self):
+        """扫描间隙预热余额/持仓/杠杆, 信号到来时下单前无需再等这些请求"""
+        def refresh(eng):
+            eng.ensure_leverage()
+            eng.sync_position()
+            return {"ok": True, "balance": eng.refresh_balance()}
+        return self._map(refresh)
+
+    def dispatch(self, signal_dict):
+        """并发开单; 返回 {账户名: {'ok', 'qty', 'order', 'error', 'latency'}}"""
+        def run(eng):
+            t0 = time.perf_counter()
+            eng.sync_position(max_age=POSITION_TTL)
+            res = eng.execute_signal(signal_dict)
+            res['latency'] = time.perf_counter() - t0
+            return res
+        return self._map(run)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+    @classmethod
+    def from_config(cls, config, secrets, symbol, accounts_file=ACCOUNTS_FILE):
+        """
+        按 config['system']['accounts'] 列出的账户名构建路由
+        账户优先取 config.json + secrets.json 的 exchanges 项, 否则取 exchanges.json
+        """
+        extra = {}
+        if os.path.exists(accounts_file):
+            with open(accounts_file, 'r', encoding='utf-8') as f:
+                extra = json.load(f)
+
+        strat = config['strategy']
+        engines = {}
+        for name in config['system'].get('accounts', ['binance_main']):
+            if name in config['exchanges']:
+                ex_conf = config['exchanges'][name]
+                ex_sec = secrets['exchanges'].get(name, {})
+            elif name in extra:
+                acct = extra[name]
+                ex_conf = {'type': 'ccxt', 'id': acct.get('exchange', 'binanceusdm')}
+                ex_sec = {'apiKey': acct.get('apiKey', ''), 'secret': acct.get('secret', '')}
+            else:
+                log.warning("⚠️ 未找到账户配置: %s", name)
+                continue
+            if not ex_sec.get('apiKey'):
+                log.warning("⚠️ 账户 %s 未配置 API Key, 已跳过", name)
+                continue
+
+            data_eng = DataEngine(name, ex_conf, ex_sec, priority=PRIORITY_ORDER)
+            engines[name] = ExecutionEngine(data_eng.client, symbol,
+                                            leverage=strat.get('leverage', 20),
+                                            risk_per_trade=strat.get('risk_per_trade', 0.018),
+                                            limiter=data_eng.limiter,
+                                            max_slippage=strat.get('max_slippage'),
+                                            account=name)
+        return cls(engines)
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+TIMEFRAME_UNITS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+
+def timeframe_to_ms(timeframe):
+    """'15m' -> 900000"""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS[timeframe[-1]]
+
+
+class IntrabarResolver:
+    """
+    高精度撮合: 仅当一根K线同时触达止损与止盈时,
+    才按需加载该K线时段内的低周期K线 (优先本地库, 可选回源交易所) 判断先后
+    """
+    def __init__(self, storage, symbol, timeframe, fine_timeframe='1m', fetcher=None, cache_size=256):
+        self.storage = storage
+        self.symbol = symbol
+        self.bar_ms = timeframe_to_ms(timeframe)
+        self.fine_timeframe = fine_timeframe
+        self.fetcher = fetcher  # 可选: DataEngine.fetch_range, 本地缺数据时回源并写入本地库
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.stats = {"ambiguous": 0, "loads": 0, "cache_hits": 0, "tp_first": 0, "unresolved": 0}
+
+    def _load(self, start_ms):
+        if start_ms in self._cache:
+            self._cache.move_to_end(start_ms)
+            self.stats['cache_hits'] += 1
+            return self._cache[start_ms]
+
+        end_ms = start_ms + self.bar_ms
+        self.stats['loads'] += 1
+        df = self.storage.load_candles(self.symbol, self.fine_timeframe, start_ms, end_ms)
+        expected = self.bar_ms // timeframe_to_ms(self.fine_timeframe)
+        if len(df) < expected and self.fetcher:
+            fetched = self.fetcher(self.symbol, self.fine_timeframe, start_ms, expected)
+            if fetched is not None and not fetched.empty:
+                self.storage.save_candles(self.symbol, self.fine_timeframe, fetched)
+                df = self.storage.load_candles(self.symbol, self.fine_timeframe, start_ms, end_ms)
+
+        bars = (df['high'].to_numpy(), df['low'].to_numpy())
+        self._cache[start_ms] = bars
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return bars
+
+    def stop_first(self, bar_time_ns, side, sl, tp):
+        """
+        返回 True 表示止损先于止盈触发
+        低周期K线内部仍然双触或缺少数据时, 保守地按止损处理
+        """
+        self.stats['ambiguous'] += 1
+        highs, lows = self._load(int(bar_time_ns) // 1_000_000)
+        if side == 'LONG':
+            hit_sl, hit_tp = lows <= sl, highs >= tp
+        else:
+            hit_sl, hit_tp = highs >= sl, lows <= tp
+
+        touched = hit_sl | hit_tp
+        if not touched.any():
+            self.stats['unresolved'] += 1
+            return True
+        k = touched.argmax()
+        if hit_tp[k] and not hit_sl[k]:
+            self.stats['tp_first'] += 1
+            return False
+        return True
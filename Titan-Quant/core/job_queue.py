@@ -0,0 +1,185 @@
+import os
+import json
+import sqlite3
+import time
+import uuid
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOB_DB = os.path.join(BASE_DIR, 'data', 'jobs.db')
+
+# 运行中任务超过该秒数没有心跳, 视为 worker 已退出, 重新排队续跑
+STALE_AFTER = 60
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLost(Exception):
+    """心跳超时后任务已被重新排队或由其他 worker 领取, 当前 worker 应放弃"""
+
+
+class JobQueue:
+    """
+    持久化回测任务队列 (SQLite)
+    多台机器共享同一目录即可共用队列; 每个参数组合的结果单独落库,
+    任务中断后重新领取时跳过已完成的组合
+    """
+    def __init__(self, db_path=JOB_DB):
+        self.db_path = db_path
+        self.job_dir = os.path.join(os.path.dirname(db_path), 'jobs')
+        os.makedirs(self.job_dir, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      kind TEXT,
+                      payload TEXT,
+                      status TEXT,
+                      progress REAL,
+                      message TEXT,
+                      worker TEXT,
+                      cancel INTEGER DEFAULT 0,
+                      created REAL,
+                      heartbeat REAL,
+                      token TEXT)""")
+        try:
+            # 旧库补充领取令牌列
+            conn.execute("ALTER TABLE jobs ADD COLUMN token TEXT")
+        except sqlite3.OperationalError:
+            pass
+        conn.execute("""CREATE TABLE IF NOT EXISTS job_results
+                     (job_id INTEGER,
+                      item TEXT,
+                      summary TEXT,
+                      path TEXT,
+                      created REAL,
+                      PRIMARY KEY (job_id, item))""")
+        conn.close()
+
+    def _conn(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def job_path(self, job_id, name):
+        """任务的附属文件 (数据快照 / 完整报告)"""
+        path = os.path.join(self.job_dir, str(job_id))
+        os.makedirs(path, exist_ok=True)
+        return os.path.join(path, name)
+
+    # ---------- 提交方 (控制台) ----------
+    def submit(self, kind, payload):
+        conn = self._conn()
+        cur = conn.execute("INSERT INTO jobs (kind, payload, status, progress, message, created) VALUES (?, ?, 'queued', 0, '', ?)",
+                           (kind, json.dumps(payload), time.time()))
+        conn.close()
+        return cur.lastrowid
+
+    def cancel(self, job_id):
+        conn = self._conn()
+        conn.execute("UPDATE jobs SET status='cancelled' WHERE id=? AND status='queued'", (job_id,))
+        conn.execute("UPDATE jobs SET cancel=1 WHERE id=? AND status='running'", (job_id,))
+        conn.close()
+
+    def resume(self, job_id):
+        """取消或失败的任务重新排队, 已完成的组合不会重跑"""
+        conn = self._conn()
+        conn.execute("UPDATE jobs SET status='queued', cancel=0, message='' WHERE id=? AND status IN ('cancelled', 'failed')", (job_id,))
+        conn.close()
+
+    def get_job(self, job_id):
+        conn = self._conn()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        conn.close()
+        return self._as_dict(row) if row else None
+
+    def list_jobs(self, limit=20):
+        conn = self._conn()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        conn.close()
+        return [self._as_dict(r) for r in rows]
+
+    def get_results(self, job_id):
+        """已完成组合的摘要 (边跑边可查)"""
+        conn = self._conn()
+        rows = conn.execute("SELECT item, summary, path FROM job_results WHERE job_id=? ORDER BY created", (job_id,)).fetchall()
+        conn.close()
+        return [{"params": json.loads(item), "summary": json.loads(summary), "path": path} for item, summary, path in rows]
+
+    @staticmethod
+    def _as_dict(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    # ---------- 执行方 (worker) ----------
+    def claim(self, worker_id):
+        """
+        原子地领取一个排队任务; 同时回收心跳超时的任务
+        每次领取生成新令牌 (job['token']), 心跳与结束都需持有当前令牌
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = self._conn()
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE jobs SET status='queued', worker=NULL, token=NULL WHERE status='running' AND heartbeat<?",
+                         (now - STALE_AFTER,))
+            row = conn.execute("SELECT * FROM jobs WHERE status='queued' ORDER BY id LIMIT 1").fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status='running', worker=?, heartbeat=?, token=? WHERE id=?",
+                             (worker_id, now, token, row['id']))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        if not row:
+            return None
+        job = self._as_dict(row)
+        job.update(status='running', worker=worker_id, heartbeat=now, token=token)
+        return job
+
+    def touch(self, job_id, token):
+        """只刷新心跳时间 (后台定时调用); 返回 False 表示已不再持有该任务"""
+        conn = self._conn()
+        cur = conn.execute("UPDATE jobs SET heartbeat=? WHERE id=? AND token=? AND status='running'",
+                           (time.time(), job_id, token))
+        conn.close()
+        return cur.rowcount > 0
+
+    def heartbeat(self, job_id, progress, message='', token=None):
+        """上报进度; 收到取消请求时抛出 JobCancelled, 任务已被他人领取时抛出 JobLost"""
+        conn = self._conn()
+        cur = conn.execute("UPDATE jobs SET progress=?, message=?, heartbeat=? WHERE id=? AND token IS ? AND status='running'",
+                           (progress, message, time.time(), job_id, token))
+        row = conn.execute("SELECT cancel FROM jobs WHERE id=?", (job_id,)).fetchone()
+        conn.close()
+        if cur.rowcount == 0:
+            raise JobLost()
+        if row[0]:
+            raise JobCancelled()
+
+    def add_result(self, job_id, params, summary, path=None):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO job_results VALUES (?, ?, ?, ?, ?)",
+                     (job_id, json.dumps(params, sort_keys=True), json.dumps(summary), path, time.time()))
+        conn.close()
+
+    def done_items(self, job_id):
+        conn = self._conn()
+        rows = conn.execute("SELECT item FROM job_results WHERE job_id=?", (job_id,)).fetchall()
+        conn.close()
+        return {r[0] for r in rows}
+
+    def finish(self, job_id, status, message='', token=None):
+        """结束任务; 令牌不匹配 (已被他人领取) 时不做修改并返回 False"""
+        conn = self._conn()
+        cur = conn.execute("UPDATE jobs SET status=?, message=?, cancel=0, token=NULL, "
+                           "progress=CASE WHEN ?='done' THEN 1 ELSE progress END WHERE id=? AND token IS ? AND status='running'",
+                           (status, message, status, job_id, token))
+        conn.close()
+        return cur.rowcount > 0
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import itertools
+import threading
+import multiprocessing
+import pandas as pd
+
+# 以 python -m core.job_worker 或脚本方式启动均可
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from core.job_queue import JobQueue, JobCancelled, JobLost, JOB_DB, STALE_AFTER
+from core.backtest_engine import BacktestEngine
+from core.data_engine import DataEngine
+from core.rate_limiter import PRIORITY_BACKTEST
+from core.storage import Storage
+from core.fill_resolver import IntrabarResolver
+from core.strategy_registry import StrategyRegistry, DEFAULT_GATE
+from core.profiler import Profiler
+from core.order_book import DepthSlippage
+from core.market_recorder import MarketReader
+from core.result_cache import ResultCache, cache_key, depth_source, range_fingerprint, frame_fingerprint, expected_end_ms
+
+CONFIG_FILE = os.path.join(BASE_DIR, 'config', 'config.json')
+SECRETS_FILE = os.path.join(BASE_DIR, 'config', 'secrets.json')
+DB_FILE = os.path.join(BASE_DIR, 'data', 'titan.db')
+POLL_INTERVAL = 2
+HEARTBEAT_INTERVAL = STALE_AFTER / 4  # 后台心跳间隔, 远小于僵死判定时长
+RECORD_BARS = 1_000_000  # K线数超过该值时权益/成交记录落盘为内存映射 (任务目录下), 不占用内存
+
+
+def load_json(path):
+    with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+
+def save_pickle(obj, path):
+    """先写临时文件再替换, 中途崩溃不会留下损坏的快照"""
+    tmp = path + '.tmp'
+    pd.to_pickle(obj, tmp, compression=None)
+    os.replace(tmp, path)
+
+def expand_grid(grid):
+    """{'sl_atr_mult': [1.5, 2.0]} -> [{'sl_atr_mult': 1.5}, {'sl_atr_mult': 2.0}]"""
+    if not grid:
+        return [{}]
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def summarize(report):
+    if "error" in report:
+        return {"error": report['error']}
+    keys = ['final_balance', 'total_return', 'total_trades', 'win_rate', 'profit_factor', 'max_drawdown']
+    return {k: float(report[k]) for k in keys}
+
+def make_data_engine():
+    conf = load_json(CONFIG_FILE)
+    sec = load_json(SECRETS_FILE)
+    return DataEngine('backtest', conf['exchanges']['binance_main'], sec['exchanges']['binance_main'], priority=PRIORITY_BACKTEST)
+
+def load_job_data(queue, job):
+    """同一任务只下载一次数据, 续跑与各参数组合共用快照"""
+    path = queue.job_path(job['id'], 'data.pkl')
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+    p = job['payload']
+    if p.get('source') == 'recorded':
+        # 本地录制的已收盘K线 (python -m core.market_recorder)
+        df = MarketReader(p['symbol'], f"kline_{p['timeframe']}").klines().tail(p['limit']).reset_index(drop=True)
+        if df.empty:
+            raise RuntimeError(f"没有 {p['symbol']} {p['timeframe']} 的本地录制K线")
+    else:
+        df = make_data_engine().fetch_ohlcv(p['symbol'], p['timeframe'], limit=p['limit'] + 1)
+        if df is not None:
+            # 去掉未走完的K线, 数据区间与缓存键 (expected_end_ms) 一致
+            end = pd.to_datetime(expected_end_ms(p['timeframe']), unit='ms')
+            df = df[df['time'] <= end].tail(p['limit']).reset_index(drop=True)
+    if df is None:
+        raise RuntimeError("数据获取失败")
+    save_pickle(df, path)
+    return df
+
+def make_registry():
+    conf = load_json(CONFIG_FILE)
+    gate = dict(conf.get('strategy_gate') or {})
+    # 验证期间没有进度回调: 超时仍限制在僵死判定时长以内, 后台心跳之外再留一道保险
+    gate['timeout'] = min(gate.get('timeout', DEFAULT_GATE['timeout']), STALE_AFTER // 2)
+    return StrategyRegistry(gate=gate, params=conf['strategy'])
+
+def run_job(queue, job, registry, cache):
+    p = job['payload']
+    job_id = job['id']
+    token = job.get('token')
+    # 准入检查可能耗时数十秒, 先上报状态 (并确认仍持有该任务)
+    queue.heartbeat(job_id, job.get('progress') or 0, "策略准入检查", token=token)
+    # 命中缓存的已编译策略类; 新内容先过准入检查, 不达标抛出 StrategyRejected
+    StratClass = registry.get(p['strategy'])
+    strat_hash = registry.source_hash(p['strategy'])
+    cache.invalidate_strategy(p['strategy'], strat_hash)
+
+    # 数据区间指纹: 已有快照按快照计算, 否则按预期区间计算 (全部命中缓存则无需下载)
+    snapshot = queue.job_path(job_id, 'data.pkl')
+    df = pd.read_pickle(snapshot) if os.path.exists(snapshot) else None
+    if df is not None:
+        data_fp = frame_fingerprint(p['symbol'], p['timeframe'], p['limit'], df)
+    else:
+        data_fp = range_fingerprint(p['symbol'], p['timeframe'], p['limit'], expected_end_ms(p['timeframe']))
+
+    resolver = None
+    if p.get('intrabar'):
+        # 同K线 SL/TP 双触时下钻 1m K线, 本地库缺失才回源
+        resolver = IntrabarResolver(Storage(DB_FILE), p['symbol'], p['timeframe'], fetcher=make_data_engine().fetch_range)
+
+    depth_events = depth_source(p['symbol'])[1] if p.get('depth') else None
+    if p.get('depth') and depth_events is None:
+        print(f"⚠️ 未找到 {p['symbol']} 的深度录制, 按K线价格成交")
+
+    combos = expand_grid(p.get('grid'))
+    done = queue.done_items(job_id)
+    for n, overrides in enumerate(combos):
+        key = json.dumps(overrides, sort_keys=True)
+        if key in done:
+            continue
+
+        def progress(bars_done, bars_total):
+            queue.heartbeat(job_id, (n + bars_done / max(bars_total, 1)) / len(combos), f"{n + 1}/{len(combos)}", token=token)
+
+        queue.heartbeat(job_id, n / len(combos), f"{n + 1}/{len(combos)}", token=token)
+        # 剖析模式必须真实重跑, 不读缓存
+        report = None if p.get('profile') else cache.get(cache_key(p, overrides, strat_hash, data_fp), p['strategy'], strat_hash)
+        if report is None and df is None:
+            df = load_job_data(queue, job)
+            data_fp = frame_fingerprint(p['symbol'], p['timeframe'], p['limit'], df)
+            report = cache.get(cache_key(p, overrides, strat_hash, data_fp), p['strategy'], strat_hash)
+        if report is None:
+            slippage = None
+            if depth_events:
+                # 从首根K线前一小时开始回放, 保证能遇到一次快照
+                first_ms = int(df['time'].to_numpy(dtype='datetime64[ms]').view('i8')[0])
+                slippage = DepthSlippage(depth_events(first_ms - 3_600_000))
+            record_path = queue.job_path(job_id, f"record_{n}") if len(df) >= RECORD_BARS else None
+            engine = BacktestEngine(initial_capital=p.get('capital', 10000), record_path=record_path,
+                                    fill_resolver=resolver, slippage_model=slippage)
+            profiler = None
+            if p.get('profile'):
+                # 剖析文件与任务其它产物放在同一目录, 控制台可直接下载
+                profiler = Profiler(os.path.dirname(snapshot))
+                profiler.start('cprofile', tag=f"backtest_{n}")
+            try:
+                report = engine.run(df, StratClass({**p.get('params', {}), **overrides}), progress_cb=progress)
+            finally:
+                if profiler: profiler.stop()
+            cache.put(cache_key(p, overrides, strat_hash, data_fp), p['strategy'], strat_hash, report)
+
+        # 完整报告落盘, 摘要入库供控制台实时展示
+        path = queue.job_path(job_id, f"result_{n}.pkl")
+        save_pickle(report, path)
+        queue.add_result(job_id, overrides, summarize(report), path)
+
+def keep_alive(queue, job, stop):
+    """
+    后台定时刷新心跳: 下载行情 / 1m 回源 / 长预热期间进度回调不会触发,
+    只靠进度心跳会超过 STALE_AFTER 而被其他 worker 重复领取
+    """
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        if not queue.touch(job['id'], job['token']):
+            break
+
+def worker_loop(db_path, worker_id):
+    queue = JobQueue(db_path)
+    registry = make_registry()
+    cache = ResultCache()
+    print(f"🛠️ Worker {worker_id} 就绪")
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        print(f"▶️ [{worker_id}] 任务 #{job['id']} ({job['kind']})")
+        stop = threading.Event()
+        beat = threading.Thread(target=keep_alive, args=(queue, job, stop), daemon=True, name=f"heartbeat-{job['id']}")
+        beat.start()
+        try:
+            run_job(queue, job, registry, cache)
+            queue.finish(job['id'], 'done', token=job['token'])
+        except JobCancelled:
+            queue.finish(job['id'], 'cancelled', '用户取消', token=job['token'])
+        except JobLost:
+            print(f"⚠️ [{worker_id}] 任务 #{job['id']} 已被重新领取, 放弃本次执行")
+        except Exception as e:
+            print(f"❌ [{worker_id}] 任务 #{job['id']} 失败: {e}")
+            queue.finish(job['id'], 'failed', str(e), token=job['token'])
+        finally:
+            stop.set()
+            beat.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Titan 回测任务 worker 池")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--db', default=JOB_DB, help="任务库路径 (多机共享目录)")
+    args = parser.parse_args()
+
+    host = socket.gethostname()
+    procs = []
+    for n in range(args.workers):
+        proc = multiprocessing.Process(target=worker_loop, args=(args.db, f"{host}-{n}"), daemon=True)
+        proc.start()
+        procs.append(proc)
+    for proc in procs:
+        proc.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# 结构化字段 (通过 logger.info(msg, extra={...}) 传入, 缺省输出 '-')
+FIELDS = ('symbol', 'stage', 'latency', 'signal')
+
+
+class DropQueueHandler(QueueHandler):
+    """
+    有界队列的非阻塞 handler: 交易线程只做一次 put_nowait,
+    队列满时直接丢弃并计数, 绝不等待磁盘
+    """
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 不在交易线程格式化消息; 仅异常堆栈需要提前展开 (traceback 对象不能跨线程久留)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """
+    停止时 QueueListener 用 put_nowait 投递结束标记, 队列已满 (磁盘慢) 会抛 queue.Full:
+    此时在当前线程写出积压记录, 腾出位置后再投递
+    """
+    def enqueue_sentinel(self):
+        while True:
+            try:
+                self.queue.put_nowait(self._sentinel)
+                return
+            except queue.Full:
+                pass
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            self.handle(record)
+            self.queue.task_done()
+
+
+class CompactFormatter(logging.Formatter):
+    """紧凑行格式: 时间|级别|symbol|stage|latency_ms|signal|消息"""
+    def format(self, record):
+        ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created))
+        fields = []
+        for name in FIELDS:
+            v = getattr(record, name, None)
+            if v is None:
+                fields.append('-')
+            elif name == 'latency':
+                fields.append(f"{v * 1000:.1f}")
+            else:
+                fields.append(str(v))
+        line = f"{ts}.{int(record.msecs):03d}|{record.levelname[0]}|{'|'.join(fields)}|{record.getMessage()}"
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class SizeTimeRotatingFileHandler(RotatingFileHandler):
+    """按大小或时间 (先到为准) 轮转"""
+    def __init__(self, filename, max_bytes, backup_count, interval):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+_handler = None
+
+def setup_logging(log_file, level=logging.INFO, max_bytes=10 * 1024 * 1024, backup_count=5,
+                  interval=86400, queue_size=10000, console=True):
+    """
+    配置根 logger: 交易线程 -> 有界队列 -> 后台线程写文件 (+控制台)
+    返回 QueueListener, 退出前调用 listener.stop() 刷完剩余日志
+    """
+    global _handler
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    fmt = CompactFormatter()
+    sinks = [SizeTimeRotatingFileHandler(log_file, max_bytes, backup_count, interval)]
+    if console:
+        sinks.append(logging.StreamHandler(sys.stdout))
+    for h in sinks:
+        h.setFormatter(fmt)
+
+    q = queue.Queue(maxsize=queue_size)
+    _handler = DropQueueHandler(q)
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel(level)
+
+    listener = DrainingQueueListener(q, *sinks, respect_handler_level=False)
+    listener.start()
+    return listener
+
+def log_stats():
+    """队列积压与丢弃计数 (写入状态文件供控制台展示)"""
+    if _handler is None:
+        return {"dropped": 0, "pending": 0}
+    return {"dropped": _handler.dropped, "pending": _handler.queue.qsize()}
@@ -0,0 +1,386 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import asyncio
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+# 以 python -m core.market_recorder 或脚本方式启动均可
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+MARKET_DIR = os.path.join(BASE_DIR, 'data', 'market')
+CHUNK_RECORDS = 1 << 20  # 每个分块文件的记录数 (预分配)
+BATCH_SIZE = 20000       # 写线程单批最多处理的消息数
+
+# 定长记录结构 (首列 ts 为毫秒时间, 用于时间索引)
+STREAM_DTYPES = {
+    # side: 0 买方主动, 1 卖方主动
+    'trade': np.dtype([('ts', 'i8'), ('id', 'i8'), ('price', 'f8'), ('qty', 'f8'), ('side', 'i1')]),
+    # 每次推送都记录 (未收盘K线会反复更新), closed=1 为收盘后的最终值
+    'kline': np.dtype([('ts', 'i8'), ('open_time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+                       ('close', 'f8'), ('volume', 'f8'), ('closed', 'i1')]),
+    # 每个价位一条记录; kind: 0 增量, 1 快照; side: 0 买, 1 卖, -1 空增量占位 (保持序号连续)
+    'depth': np.dtype([('ts', 'i8'), ('first_id', 'i8'), ('final_id', 'i8'), ('prev_id', 'i8'),
+                       ('kind', 'i1'), ('side', 'i1'), ('price', 'f8'), ('qty', 'f8')]),
+}
+
+
+def symbol_slug(symbol):
+    return re.sub(r'[^0-9A-Za-z]+', '_', symbol)
+
+def stream_dtype(stream):
+    """'kline_1m' -> kline 结构"""
+    return STREAM_DTYPES[stream.split('_')[0]]
+
+def stream_dir(symbol, stream, root=MARKET_DIR):
+    return os.path.join(root, symbol_slug(symbol), stream)
+
+def _load_index(path):
+    try:
+        with open(os.path.join(path, 'index.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_message(msg):
+    """
+    Binance 原始消息 -> [(流名, 记录元组), ...]
+    支持 aggTrade / trade / kline / depthUpdate, 以及 REST/ccxt 盘口快照
+    """
+    if 'data' in msg and 'stream' in msg:
+        msg = msg['data']
+    e = msg.get('e')
+    if e in ('aggTrade', 'trade'):
+        return [('trade', (msg['T'], msg.get('a', msg.get('t')), float(msg['p']), float(msg['q']), 1 if msg['m'] else 0))]
+    if e == 'kline':
+        k = msg['k']
+        return [(f"kline_{k['i']}", (msg['E'], k['t'], float(k['o']), float(k['h']), float(k['l']),
+                                     float(k['c']), float(k['v']), 1 if k['x'] else 0))]
+    if e == 'depthUpdate':
+        ts, first, final, prev = msg['E'], msg['U'], msg['u'], msg.get('pu', -1)
+        rows = [('depth', (ts, first, final, prev, 0, 0, float(p), float(q))) for p, q in msg['b']]
+        rows += [('depth', (ts, first, final, prev, 0, 1, float(p), float(q))) for p, q in msg['a']]
+        return rows or [('depth', (ts, first, final, prev, 0, -1, 0.0, 0.0))]
+    if 'bids' in msg:
+        uid = msg.get('lastUpdateId', msg.get('nonce')) or 0
+        ts = msg.get('E') or msg.get('T') or msg.get('timestamp') or int(time.time() * 1000)
+        rows = [('depth', (ts, uid, uid, uid, 1, 0, float(p), float(q))) for p, q in msg['bids']]
+        rows += [('depth', (ts, uid, uid, uid, 1, 1, float(p), float(q))) for p, q in msg['asks']]
+        return rows
+    return []
+
+
+class ChunkWriter:
+    """
+    单个 (symbol, 流) 的追加写入: 预分配定长分块 + 内存映射
+    先刷数据再写索引, 读端只认索引中已提交的条数
+    """
+    def __init__(self, path, dtype, chunk_records=CHUNK_RECORDS):
+        self.path = path
+        self.dtype = dtype
+        os.makedirs(path, exist_ok=True)
+        self.index = _load_index(path) or {"dtype": [list(d) for d in dtype.descr], "chunk_records": chunk_records, "chunks": []}
+        self.chunk_records = self.index['chunk_records']
+        self.mm = None
+        self.dirty = False
+        chunks = self.index['chunks']
+        self.last_ts = chunks[-1]['end_ts'] if chunks else np.iinfo('i8').min
+        if chunks and chunks[-1]['count'] < self.chunk_records:
+            # 续写未写满的最后一个分块
+            self.mm = np.memmap(os.path.join(path, chunks[-1]['file']), dtype=dtype, mode='r+', shape=(self.chunk_records,))
+
+    def _new_chunk(self):
+        chunks = self.index['chunks']
+        name = f"{len(chunks):06d}.bin"
+        self.mm = np.memmap(os.path.join(self.path, name), dtype=self.dtype, mode='w+', shape=(self.chunk_records,))
+        chunks.append({"file": name, "count": 0, "start_ts": None, "end_ts": None})
+
+    def write(self, rows):
+        # 时间索引要求 ts 单调: 盘口快照带的是更早的服务器时间, 而比它新的增量已经写入;
+        # 按写入顺序取已写入的最大时间, 即以到达顺序为准
+        if len(rows):
+            rows['ts'] = np.maximum.accumulate(np.r_[self.last_ts, rows['ts']])[1:]
+            self.last_ts = int(rows['ts'][-1])
+        i = 0
+        while i < len(rows):
+            if self.mm is None:
+                self._new_chunk()
+            meta = self.index['chunks'][-1]
+            n = min(len(rows) - i, self.chunk_records - meta['count'])
+            part = rows[i:i + n]
+            self.mm[meta['count']:meta['count'] + n] = part
+            if meta['start_ts'] is None:
+                meta['start_ts'] = int(part['ts'][0])
+            meta['end_ts'] = int(part['ts'][-1])
+            meta['count'] += n
+            self.dirty = True
+            i += n
+            if meta['count'] == self.chunk_records:
+                self.flush()
+                self.mm = None
+
+    def flush(self):
+        if not self.dirty:
+            return
+        if self.mm is not None:
+            self.mm.flush()
+        tmp = os.path.join(self.path, 'index.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, os.path.join(self.path, 'index.json'))
+        self.dirty = False
+
+
+class MarketRecorder:
+    """
+    行情录制: 采集线程只做一次 put_nowait (队列满则丢弃计数, 绝不阻塞),
+    后台线程批量解析并写入按 symbol/流 分块的内存映射文件
+    """
+    def __init__(self, root=MARKET_DIR, chunk_records=CHUNK_RECORDS, queue_size=500000, flush_interval=1.0):
+        self.root = root
+        self.chunk_records = chunk_records
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writers = {}
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='recorder')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """写完队列中剩余消息并刷盘"""
+        self.queue.put(None)
+        self._thread.join()
+
+    def put(self, symbol, msg):
+        try:
+            self.queue.put_nowait((symbol, msg))
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "pending": self.queue.qsize()}
+
+    def _writer(self, symbol, stream):
+        key = (symbol, stream)
+        if key not in self.writers:
+            self.writers[key] = ChunkWriter(stream_dir(symbol, stream, self.root), stream_dtype(stream), self.chunk_records)
+        return self.writers[key]
+
+    def _run(self):
+        last_flush = time.time()
+        running = True
+        while running:
+            try:
+                items = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                items = []
+            while len(items) < BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batches = {}
+            for item in items:
+                if item is None:
+                    running = False
+                    continue
+                symbol, msg = item
+                try:
+                    for stream, row in parse_message(msg):
+                        batches.setdefault((symbol, stream), []).append(row)
+                except (KeyError, TypeError, ValueError):
+                    self.dropped += 1
+            for (symbol, stream), rows in batches.items():
+                self._writer(symbol, stream).write(np.array(rows, dtype=stream_dtype(stream)))
+                self.written += len(rows)
+
+            if not running or time.time() - last_flush >= self.flush_interval:
+                for w in self.writers.values():
+                    w.flush()
+                last_flush = time.time()
+
+
+class MarketReader:
+    """
+    零拷贝读取: 区间查询直接返回内存映射上的 NumPy 视图 (结构化数组, 按列取即可)
+    录制进程仍在追加时, 调用 refresh() 读取最新索引
+    """
+    def __init__(self, symbol, stream, root=MARKET_DIR):
+        self.symbol = symbol
+        self.stream = stream
+        self.path = stream_dir(symbol, stream, root)
+        self.dtype = stream_dtype(stream)
+        self._maps = {}
+        self.refresh()
+
+    def refresh(self):
+        self.index = _load_index(self.path) or {"chunk_records": CHUNK_RECORDS, "chunks": []}
+        return self
+
+    def __len__(self):
+        return sum(c['count'] for c in self.index['chunks'])
+
+    def signature(self):
+        """录制进度 (条数, 末条时间), 用作回测缓存键"""
+        chunks = self.index['chunks']
+        return [len(self), chunks[-1]['end_ts'] if chunks else None]
+
+    def _chunk(self, meta):
+        mm = self._maps.get(meta['file'])
+        if mm is None:
+            mm = np.memmap(os.path.join(self.path, meta['file']), dtype=self.dtype, mode='r', shape=(self.index['chunk_records'],))
+            self._maps[meta['file']] = mm
+        return mm[:meta['count']]
+
+    def ranges(self, start_ms=None, end_ms=None):
+        """逐分块返回 [start_ms, end_ms] 内的视图"""
+        for meta in self.index['chunks']:
+            if not meta['count']:
+                continue
+            if start_ms is not None and meta['end_ts'] < start_ms:
+                continue
+            if end_ms is not None and meta['start_ts'] > end_ms:
+                break
+            view = self._chunk(meta)
+            ts = view['ts']
+            lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side='left'))
+            hi = len(view) if end_ms is None else int(np.searchsorted(ts, end_ms, side='right'))
+            if hi > lo:
+                yield view[lo:hi]
+
+    def read(self, start_ms=None, end_ms=None):
+        """区间落在单个分块内时为视图, 跨分块时拼接 (复制)"""
+        parts = list(self.ranges(start_ms, end_ms))
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def klines(self, start_ms=None, end_ms=None):
+        """已收盘K线 DataFrame (time/open/high/low/close/volume), 可直接交给 BacktestEngine"""
+        rec = self.read(start_ms, end_ms)
+        rec = rec[rec['closed'] == 1]
+        # 同一根K线若重复推送, 取最后一条
+        _, last = np.unique(rec['open_time'][::-1], return_index=True)
+        rec = rec[len(rec) - 1 - last]
+        return pd.DataFrame({
+            'time': pd.to_datetime(rec['open_time'], unit='ms'),
+            'open': rec['open'], 'high': rec['high'], 'low': rec['low'],
+            'close': rec['close'], 'volume': rec['volume']
+        })
+
+    def depth_events(self, start_ms=None, end_ms=None):
+        """
+        按录制顺序还原盘口消息 (OrderBook.apply / DepthSlippage 可直接消费)
+        一条消息的多档记录可能被分块边界切开: 每个分块的最后一组先暂存, 与下一分块开头的同一消息合并后再输出
+        """
+        carry = None
+        for view in self.ranges(start_ms, end_ms):
+            # 相邻记录 (final_id, kind) 变化处即消息边界
+            change = (view['final_id'][1:] != view['final_id'][:-1]) | (view['kind'][1:] != view['kind'][:-1])
+            bounds = np.r_[0, np.flatnonzero(change) + 1, len(view)]
+            groups = [view[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+            if carry is not None:
+                head = groups[0][0]
+                if head['final_id'] == carry[0]['final_id'] and head['kind'] == carry[0]['kind']:
+                    groups[0] = np.concatenate((carry, groups[0]))
+                else:
+                    yield _depth_message(carry)
+            for g in groups[:-1]:
+                yield _depth_message(g)
+            carry = groups[-1]
+        if carry is not None:
+            yield _depth_message(carry)
+
+
+def _depth_message(g):
+    """同一消息的 depth 记录 -> 快照 / 增量消息"""
+    side = g['side']
+    levels = np.column_stack((g['price'], g['qty']))
+    bids, asks = levels[side == 0], levels[side == 1]
+    head = g[0]
+    if head['kind'] == 1:
+        return {"lastUpdateId": int(head['final_id']), "E": int(head['ts']), "bids": bids, "asks": asks}
+    return {"E": int(head['ts']), "U": int(head['first_id']), "u": int(head['final_id']),
+            "pu": int(head['prev_id']), "b": bids, "a": asks}
+
+
+# ---------- 实时采集 (Binance U本位合约 WebSocket) ----------
+WS_URL = 'wss://fstream.binance.com/stream?streams='
+
+async def _snapshot_loop(recorder, data_engine, symbols, interval):
+    """定时记录 REST 盘口快照: 回放可从任意快照处开始, 断档后也能重新同步"""
+    loop = asyncio.get_running_loop()
+    while True:
+        for symbol in symbols:
+            try:
+                ob = await loop.run_in_executor(None, lambda s=symbol: data_engine.fetch_order_book(s, limit=1000))
+                recorder.put(symbol, ob)
+            except Exception as e:
+                print(f"快照获取失败 [{symbol}]: {e}")
+        await asyncio.sleep(interval)
+
+async def _stream(recorder, symbols, streams, data_engine, snapshot_interval):
+    import aiohttp  # ccxt 的依赖, 仅实时采集需要
+    by_id = {re.sub(r'[^0-9a-z]', '', s.lower()): s for s in symbols}
+    url = WS_URL + '/'.join(f"{sid}@{st}" for sid in by_id for st in streams)
+    backoff = 1
+    while True:
+        snapshots = None
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(url, heartbeat=30) as ws:
+                    print(f"📡 已连接 {len(by_id)} 个品种 / {len(streams)} 个流")
+                    backoff = 1
+                    # 每次 (重) 连接后先记录快照, 增量才能接续
+                    if data_engine and any(st.startswith('depth') for st in streams):
+                        snapshots = asyncio.create_task(_snapshot_loop(recorder, data_engine, symbols, snapshot_interval))
+                    async for m in ws:
+                        if m.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        msg = json.loads(m.data)
+                        data = msg.get('data', msg)
+                        recorder.put(by_id.get(str(data.get('s', '')).lower(), symbols[0]), data)
+        except Exception as e:
+            print(f"⚠️ 连接中断: {e}, {backoff}s 后重连")
+        finally:
+            if snapshots:
+                snapshots.cancel()
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+def main():
+    from core.data_engine import DataEngine
+    parser = argparse.ArgumentParser(description="Titan-Quant 行情录制")
+    parser.add_argument('--symbols', default='BTC/USDT', help='逗号分隔, 如 BTC/USDT,ETH/USDT')
+    parser.add_argument('--streams', default='aggTrade,kline_1m,depth@100ms')
+    parser.add_argument('--snapshot-interval', type=int, default=600, help='盘口快照间隔 (秒)')
+    parser.add_argument('--root', default=MARKET_DIR)
+    args = parser.parse_args()
+
+    with open(os.path.join(BASE_DIR, 'config', 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    data_engine = DataEngine('recorder', config['exchanges']['binance_main'], {})
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    recorder = MarketRecorder(args.root).start()
+    try:
+        asyncio.run(_stream(recorder, symbols, args.streams.split(','), data_engine, args.snapshot_interval))
+    except KeyboardInterrupt:
+        recorder.stop()
+        print(f"🛑 录制结束: {recorder.stats()}")
+
+if __name__ == '__main__':
+    main()
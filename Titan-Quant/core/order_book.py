@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import numpy as np
+from collections import deque
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPTH_DIR = os.path.join(BASE_DIR, 'data', 'depth')
+DIFF_BUFFER = 2000  # 缓存最近的增量条数 (depth@100ms 约 200 秒), 快照到达后补放
+
+
+def depth_path(symbol):
+    """录制的深度文件: data/depth/BTC_USDT.jsonl (每行一条快照或增量消息)"""
+    return os.path.join(DEPTH_DIR, re.sub(r'[^0-9A-Za-z]+', '_', symbol) + '.jsonl')
+
+def iter_depth_file(path):
+    """逐行读取录制的深度消息 (不整体载入内存), 跳过损坏行"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def event_time(msg):
+    """消息时间 (毫秒): Binance 增量为 E, REST/ccxt 快照为 E/T/timestamp"""
+    return msg.get('E') or msg.get('T') or msg.get('timestamp')
+
+
+class OrderBookGap(Exception):
+    """增量序号不连续, 本地盘口已失效, 需要重新加载快照"""
+
+
+class BookSide:
+    """
+    单边盘口 (预分配数组): 价格键升序存放, 买盘存负价, 下标 0 即最优价
+    二分定位档位, 插入/删除只移动一段连续内存
+    """
+    def __init__(self, sign, capacity):
+        self.sign = sign  # 卖盘 +1, 买盘 -1
+        self.keys = np.empty(capacity, dtype='f8')
+        self.sizes = np.empty(capacity, dtype='f8')
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def prices(self):
+        return self.keys[:self.n] * self.sign
+
+    def best(self):
+        return float(self.keys[0] * self.sign) if self.n else None
+
+    def load(self, levels):
+        lv = np.asarray(levels, dtype='f8').reshape(-1, 2)
+        lv = lv[lv[:, 1] > 0]
+        keys = lv[:, 0] * self.sign
+        order = np.argsort(keys, kind='stable')[:len(self.keys)]
+        self.n = len(order)
+        self.keys[:self.n] = keys[order]
+        self.sizes[:self.n] = lv[order, 1]
+
+    def update(self, price, size):
+        """数量为 0 表示删除该档; 满额时挤掉最差一档, 比最差档还差的新档位忽略"""
+        key = price * self.sign
+        n = self.n
+        i = int(np.searchsorted(self.keys[:n], key))
+        if i < n and self.keys[i] == key:
+            if size > 0:
+                self.sizes[i] = size
+            else:
+                self.keys[i:n - 1] = self.keys[i + 1:n]
+                self.sizes[i:n - 1] = self.sizes[i + 1:n]
+                self.n = n - 1
+            return
+        if size <= 0:
+            return
+        if n == len(self.keys):
+            if i >= n:
+                return
+            n -= 1
+        self.keys[i + 1:n + 1] = self.keys[i:n]
+        self.sizes[i + 1:n + 1] = self.sizes[i:n]
+        self.keys[i] = key
+        self.sizes[i] = size
+        self.n = n + 1
+
+    def fill(self, qty):
+        """
+        吃单 qty 的 (成交量, 均价, 最差价); 深度不足时只成交现有部分
+        """
+        n = self.n
+        if n == 0 or qty <= 0:
+            return 0.0, None, None
+        px = self.prices()
+        cum_q = np.cumsum(self.sizes[:n])
+        cum_v = np.cumsum(px * self.sizes[:n])
+        k = int(np.searchsorted(cum_q, qty))
+        if k >= n:
+            return float(cum_q[-1]), float(cum_v[-1] / cum_q[-1]), float(px[-1])
+        prev_q = cum_q[k - 1] if k else 0.0
+        prev_v = cum_v[k - 1] if k else 0.0
+        return float(qty), float((prev_v + (qty - prev_q) * px[k]) / qty), float(px[k])
+
+    def max_qty(self, avg_limit):
+        """成交均价不劣于 avg_limit 时最多可吃的数量"""
+        n = self.n
+        if n == 0:
+            return 0.0
+        # 在价格键空间里比较, 买卖两侧统一为 "均价键 <= 上限键"
+        keys, sizes = self.keys[:n], self.sizes[:n]
+        limit = avg_limit * self.sign
+        cum_q = np.cumsum(sizes)
+        cum_v = np.cumsum(keys * sizes)
+        m = int(np.searchsorted(cum_v / cum_q, limit, side='right'))  # 完整吃掉的档数
+        if m >= n:
+            return float(cum_q[-1])
+        prev_q = cum_q[m - 1] if m else 0.0
+        prev_v = cum_v[m - 1] if m else 0.0
+        # 第 m 档部分成交: (prev_v + key*x) / (prev_q + x) = limit
+        x = (limit * prev_q - prev_v) / (keys[m] - limit)
+        return float(prev_q + min(max(x, 0.0), sizes[m]))
+
+
+class OrderBook:
+    """
+    本地 L2 盘口: 由快照 + 增量维护 (Binance depth 流 / REST / ccxt fetch_order_book 格式均可)
+    只依赖消息本身, 可直接用录制的深度文件回放, 无需连接交易所
+    """
+    def __init__(self, symbol=None, depth=1000):
+        self.symbol = symbol
+        self.bids = BookSide(-1, depth)
+        self.asks = BookSide(1, depth)
+        self.last_update_id = None
+        self.ts = None
+        self._from_diff = False
+        self._recent = deque(maxlen=DIFF_BUFFER)
+
+    @property
+    def ready(self):
+        return self.last_update_id is not None and len(self.bids) > 0 and len(self.asks) > 0
+
+    def clear(self):
+        self.bids.n = self.asks.n = 0
+        self.last_update_id = None
+        self._from_diff = False
+
+    def apply_snapshot(self, bids, asks, update_id=0, ts=None):
+        self.bids.load(bids)
+        self.asks.load(asks)
+        self.last_update_id = update_id or 0
+        self.ts = ts
+        self._from_diff = False
+
+    def apply_diff(self, bids, asks, first_id=None, final_id=None, prev_id=None, ts=None):
+        """
+        应用增量; 返回 False 表示快照之前的旧消息已跳过
+        序号断档时清空盘口并抛出 OrderBookGap, 等待下一个快照
+        """
+        if self.last_update_id is None:
+            raise OrderBookGap("尚未加载快照")
+        if final_id is not None:
+            if final_id <= self.last_update_id:
+                return False
+            # 合约流以 pu 衔接上一条增量; 现货流及快照后的首条增量以 U 衔接
+            if prev_id is not None and self._from_diff:
+                gap = prev_id != self.last_update_id
+            else:
+                gap = first_id is not None and first_id > self.last_update_id + 1
+            if gap:
+                msg = f"增量断档: 本地 {self.last_update_id}, 收到 {first_id}-{final_id}"
+                self.clear()
+                raise OrderBookGap(msg)
+            self.last_update_id = final_id
+            self._from_diff = True
+        for price, size in bids:
+            self.bids.update(float(price), float(size))
+        for price, size in asks:
+            self.asks.update(float(price), float(size))
+        self.ts = ts
+        return True
+
+    def _apply_diff_msg(self, msg):
+        return self.apply_diff(msg.get('b', []), msg.get('a', []), msg.get('U'), msg.get('u'), msg.get('pu'), event_time(msg))
+
+    def apply(self, msg):
+        """
+        按原始消息格式分派到快照或增量
+        REST 快照返回时, 比它新的增量通常已先到 (录制文件中也排在快照之前):
+        按 Binance 的维护流程, 载入快照后补放缓存中 u > lastUpdateId 的增量
+        """
+        if 'bids' in msg:
+            uid = msg.get('lastUpdateId', msg.get('nonce'))
+            self.apply_snapshot(msg['bids'], msg['asks'], uid, event_time(msg))
+            for diff in list(self._recent):
+                if diff.get('u') is not None and diff['u'] > self.last_update_id:
+                    self._apply_diff_msg(diff)
+            return True
+        self._recent.append(msg)
+        return self._apply_diff_msg(msg)
+
+    def _side(self, side):
+        """买单吃卖盘, 卖单吃买盘"""
+        return self.asks if side == 'buy' else self.bids
+
+    def best_bid(self):
+        return self.bids.best()
+
+    def best_ask(self):
+        return self.asks.best()
+
+    def mid(self):
+        if not self.ready: return None
+        return (self.best_bid() + self.best_ask()) / 2
+
+    def fill(self, side, qty):
+        """市价 side ('buy'/'sell') 成交 qty 的 (成交量, 均价, 最差价)"""
+        return self._side(side).fill(qty)
+
+    def slippage(self, side, qty):
+        """成交均价相对最优价的不利偏离 (比例); 深度不足返回 None"""
+        book = self._side(side)
+        filled, avg, _ = book.fill(qty)
+        if filled < qty:
+            return None
+        best = book.best()
+        return (avg - best) / best if side == 'buy' else (best - avg) / best
+
+    def max_qty(self, side, max_slippage):
+        """均价偏离最优价不超过 max_slippage 时可成交的最大数量"""
+        book = self._side(side)
+        best = book.best()
+        if best is None:
+            return 0.0
+        limit = best * (1 + max_slippage) if side == 'buy' else best * (1 - max_slippage)
+        return book.max_qty(limit)
+
+
+def load_book(path, until_ms=None, depth=1000):
+    """从录制文件重建 until_ms 时刻 (默认文件末尾) 的盘口"""
+    book = OrderBook(depth=depth)
+    for msg in iter_depth_file(path):
+        if until_ms is not None and (event_time(msg) or 0) > until_ms:
+            break
+        try:
+            book.apply(msg)
+        except OrderBookGap:
+            continue
+    return book
+
+
+class DepthSlippage:
+    """
+    回测滑点模型: 盘口按时间顺序回放到成交时刻,
+    以吃单均价相对最优价的偏离修正K线成交价; 深度不足的剩余部分按最差档计
+    成交时刻附近没有有效盘口时按原价成交
+    """
+    def __init__(self, events, depth=1000, max_age_ms=60_000):
+        self.book = OrderBook(depth=depth)
+        self.max_age_ms = max_age_ms
+        self._events = iter(events)
+        self._pending = next(self._events, None)
+        self.stats = {"fills": 0, "no_book": 0, "short_depth": 0, "gaps": 0}
+
+    def _advance(self, ts_ms):
+        while self._pending is not None and (event_time(self._pending) or 0) <= ts_ms:
+            try:
+                self.book.apply(self._pending)
+            except OrderBookGap:
+                self.stats['gaps'] += 1
+            self._pending = next(self._events, None)
+
+    def fill_price(self, ts_ns, side, qty, price):
+        ts_ms = int(ts_ns) // 1_000_000
+        self._advance(ts_ms)
+        book = self.book
+        if not book.ready or book.ts is None or ts_ms - book.ts > self.max_age_ms:
+            self.stats['no_book'] += 1
+            return price
+        filled, avg, worst = book.fill(side, qty)
+        if filled < qty:
+            self.stats['short_depth'] += 1
+            avg = (avg * filled + worst * (qty - filled)) / qty
+        self.stats['fills'] += 1
+        best = book.best_ask() if side == 'buy' else book.best_bid()
+        return price * avg / best
@@ -0,0 +1,113 @@
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_DIR = os.path.join(BASE_DIR, 'logs', 'profiles')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class Profiler:
+    """
+    按需性能剖析 (默认关闭, 关闭时零开销)
+    mode='sample':   后台线程定时抓取目标线程调用栈, 开销低, 适合实盘
+    mode='cprofile': 确定性剖析, 数据精确, 适合单次回测
+    输出: {tag}_{时间}.collapsed (flamegraph.pl / speedscope 可直接打开) + .txt 摘要 (+ .prof)
+    """
+    def __init__(self, out_dir=PROFILE_DIR):
+        self.out_dir = out_dir
+        self.mode = None
+        self.deadline = None
+        self._prof = None
+        self._sampler = None
+        self._stacks = None
+
+    @property
+    def active(self):
+        return self.mode is not None
+
+    def expired(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def start(self, mode='sample', tag='live', duration=None, interval=0.005):
+        if self.active:
+            return
+        self.mode = mode
+        self.tag = tag
+        self.started = time.time()
+        self.deadline = self.started + duration if duration else None
+        if mode == 'cprofile':
+            self._prof = cProfile.Profile()
+            self._prof.enable()
+        else:
+            self._stacks = Counter()
+            self._stop_evt = threading.Event()
+            target = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample, args=(target, interval), daemon=True, name='profiler')
+            self._sampler.start()
+
+    def _sample(self, target, interval):
+        while not self._stop_evt.wait(interval):
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self._stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        """停止剖析并写出文件, 返回 {类型: 路径}"""
+        if not self.active:
+            return {}
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self.tag}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started))}")
+        paths = {"collapsed": base + '.collapsed', "summary": base + '.txt'}
+
+        if self.mode == 'cprofile':
+            self._prof.disable()
+            paths['prof'] = base + '.prof'
+            self._prof.dump_stats(paths['prof'])
+            stats = pstats.Stats(self._prof)
+            # 确定性剖析没有完整调用栈: 以 调用者;被调用者 两层栈近似
+            # 权重取自身耗时 (微秒), 各栈之和等于总耗时, 嵌套调用不重复计入
+            stacks = Counter()
+            for func, (_, _, tottime, _, callers) in stats.stats.items():
+                callee = f"{os.path.basename(func[0])}:{func[2]}:{func[1]}"
+                if not callers:
+                    stacks[callee] += int(tottime * 1e6)
+                for caller, info in callers.items():
+                    stacks[f"{os.path.basename(caller[0])}:{caller[2]}:{caller[1]};{callee}"] += int(info[2] * 1e6)
+            buf = io.StringIO()
+            pstats.Stats(self._prof, stream=buf).sort_stats('cumulative').print_stats(40)
+            summary = buf.getvalue()
+        else:
+            self._stop_evt.set()
+            self._sampler.join()
+            stacks = self._stacks
+            leaves = Counter()
+            for stack, n in stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += n
+            total = sum(leaves.values()) or 1
+            summary = f"samples: {total}\n" + '\n'.join(f"{n * 100 / total:6.2f}%  {name}" for name, n in leaves.most_common(40))
+
+        with open(paths['collapsed'], 'w', encoding='utf-8') as f:
+            for stack, n in stacks.items():
+                f.write(f"{stack} {n}\n")
+        with open(paths['summary'], 'w', encoding='utf-8') as f:
+            f.write(summary)
+
+        self.mode = None
+        self.deadline = None
+        self._prof = self._sampler = self._stacks = None
+        return paths
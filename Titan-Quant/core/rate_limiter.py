@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIMIT_DB = os.path.join(BASE_DIR, 'data', 'rate_limit.db')
+
+# 请求优先级 (数值越小越优先)
+PRIORITY_ORDER = 0      # 下单 / 撤单 / 平仓
+PRIORITY_LIVE = 1       # 实盘行情 / 余额 / 持仓
+PRIORITY_BACKTEST = 2   # 回测历史数据下载
+
+# 各优先级消费后桶内必须保留的比例: 低优先级永远给下单留出余量
+DEFAULT_RESERVE = {PRIORITY_ORDER: 0.0, PRIORITY_LIVE: 0.15, PRIORITY_BACKTEST: 0.4}
+
+# Binance U本位接口权重 (按 IP 计, 2400/分钟)
+REQUEST_WEIGHTS = {
+    'create_order': 1,
+    'create_market_order': 1,
+    'cancel_order': 1,
+    'cancel_all_orders': 1,
+    'set_leverage': 1,
+    'fetch_balance': 5,
+    'fetch_positions': 5,
+    'fetch_ticker': 1,
+    'fetch_order_book': 5,
+}
+
+# 等待中的请求超过该时长未刷新视为已退出
+WAITER_TTL = 5
+
+
+def request_weight(method, limit=None):
+    """估算一次 REST 调用的权重"""
+    if method == 'fetch_ohlcv':
+        limit = limit or 500
+        if limit < 100: return 1
+        if limit < 500: return 2
+        if limit <= 1000: return 5
+        return 10
+    if method == 'fetch_order_book' and limit:
+        if limit <= 50: return 2
+        if limit <= 100: return 5
+        if limit <= 500: return 10
+        return 20
+    return REQUEST_WEIGHTS.get(method, 1)
+
+
+class RateLimiter:
+    """
+    跨进程令牌桶 (SQLite 文件锁实现)
+    main.py / 控制台 / 指令引擎 / 回测下载 共享同一份权重预算,
+    高优先级请求排队时, 低优先级请求主动让行
+    """
+    def __init__(self, bucket='binanceusdm', capacity=2000, window=60, reserve=None, db_path=LIMIT_DB):
+        self.bucket = bucket
+        self.capacity = float(capacity)
+        self.rate = self.capacity / window  # 每秒回填的权重
+        self.reserve = dict(DEFAULT_RESERVE, **(reserve or {}))
+        self.waiter_id = f"{os.getpid()}-{id(self)}"
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL, banned_until REAL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, bucket TEXT, priority INTEGER, ts REAL)")
+        self.conn.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, 0)", (bucket, self.capacity, time.time()))
+
+    def _refill(self, now):
+        tokens, updated, banned_until = self.conn.execute(
+            "SELECT tokens, updated, banned_until FROM buckets WHERE name=?", (self.bucket,)).fetchone()
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        return tokens, banned_until
+
+    def waiter_for(self, key):
+        """同一进程内多个调用方 (如多账户执行线程) 共用限流器时的独立排队身份"""
+        return f"{self.waiter_id}-{key}"
+
+    def _try_acquire(self, weight, priority, waiter):
+        """单次尝试, 成功返回 0, 否则返回建议等待秒数"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, banned_until = self._refill(now)
+                ahead = self.conn.execute(
+                    "SELECT COUNT(*) FROM waiters WHERE bucket=? AND priority<? AND ts>? AND id<>?",
+                    (self.bucket, priority, now - WAITER_TTL, waiter)).fetchone()[0]
+                floor = self.reserve.get(priority, 0.0) * self.capacity
+                need = min(weight + floor, self.capacity)
+
+                if now < banned_until:
+                    wait = banned_until - now
+                elif ahead:
+                    wait = 0.05
+                elif tokens >= need:
+                    self.conn.execute("UPDATE buckets SET tokens=?, updated=? WHERE name=?",
+                                      (tokens - weight, now, self.bucket))
+                    self.conn.execute("DELETE FROM waiters WHERE id=?", (waiter,))
+                    self.conn.execute("COMMIT")
+                    return 0
+                else:
+                    wait = (need - tokens) / self.rate
+
+                # 登记排队, 让更低优先级的进程看到
+                self.conn.execute("INSERT OR REPLACE INTO waiters VALUES (?, ?, ?, ?)",
+                                  (waiter, self.bucket, priority, now))
+                self.conn.execute("COMMIT")
+                return wait
+            except:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def acquire(self, weight=1, priority=PRIORITY_LIVE, timeout=None, waiter=None):
+        """阻塞直到获得 weight 个令牌; 超时返回 False. waiter: 排队身份, 默认为本限流器"""
+        waiter = waiter or self.waiter_id
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = self._try_acquire(weight, priority, waiter)
+            if wait == 0:
+                return True
+            if deadline is not None and time.time() + wait > deadline:
+                self._leave(waiter)
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def _leave(self, waiter):
+        with self._lock:
+            self.conn.execute("DELETE FROM waiters WHERE id=?", (waiter,))
+
+    def observe(self, used_weight):
+        """用交易所返回的已用权重 (X-MBX-USED-WEIGHT-1M) 校准本地桶"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            tokens, _ = self._refill(now)
+            tokens = min(tokens, self.capacity - float(used_weight))
+            self.conn.execute("UPDATE buckets SET tokens=?, updated=? WHERE name=?", (tokens, now, self.bucket))
+            self.conn.execute("COMMIT")
+
+    def penalize(self, seconds):
+        """收到 429/418 后, 所有进程一起退避"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("UPDATE buckets SET tokens=0, updated=?, banned_until=MAX(banned_until, ?) WHERE name=?",
+                              (now, now + seconds, self.bucket))
+
+
+_limiters = {}
+
+def get_limiter(bucket='binanceusdm', **kwargs):
+    """进程内复用同一个限流器 (DataEngine 会被频繁创建)"""
+    if bucket not in _limiters:
+        _limiters[bucket] = RateLimiter(bucket, **kwargs)
+    return _limiters[bucket]
@@ -0,0 +1,175 @@
+import os
+import re
+import glob
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from core.backtest_engine import ENGINE_VERSION
+from core.fill_resolver import timeframe_to_ms
+from core.order_book import depth_path, iter_depth_file
+from core.market_recorder import MarketReader
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, 'data', 'bt_cache')
+WEEK_OFFSET_MS = 4 * 86_400_000  # 1970-01-01 为周四, 交易所周线从周一 00:00 UTC 开盘
+
+
+def _sha(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def bar_open_ms(timeframe, ts_ms):
+    """ts_ms 所在K线的开盘时间 (周线按周一 00:00 UTC 对齐)"""
+    bar = timeframe_to_ms(timeframe)
+    offset = WEEK_OFFSET_MS if timeframe.endswith('w') else 0
+    return (ts_ms - offset) // bar * bar + offset
+
+def expected_end_ms(timeframe, now=None):
+    """最后一根已收盘K线的开盘时间; 未走完的K线 OHLC 仍在变化, 不计入数据区间"""
+    now_ms = int((now or time.time()) * 1000)
+    return bar_open_ms(timeframe, now_ms) - timeframe_to_ms(timeframe)
+
+def range_fingerprint(symbol, timeframe, limit, end_ms):
+    """数据区间指纹 (请求根数 + 末根K线时间): 无需下载即可计算"""
+    return _sha(["range", symbol, timeframe, int(limit), int(end_ms)])
+
+def frame_fingerprint(symbol, timeframe, limit, df):
+    """按已下载数据的实际末根K线计算指纹"""
+    end_ms = int(df['time'].to_numpy(dtype='datetime64[ms]').view('i8')[-1])
+    return range_fingerprint(symbol, timeframe, limit, end_ms)
+
+def run_key(data_fp, strategy_hash, params, options=None):
+    """结果键 = (数据区间, 策略源码, 参数, 引擎版本)"""
+    return _sha([data_fp, strategy_hash, _sha(params), _sha(options or {}), ENGINE_VERSION])
+
+def depth_source(symbol):
+    """
+    回测盘口来源: 优先行情录制 (data/market), 其次 data/depth 下的 JSONL
+    返回 (版本签名, 消息迭代器工厂(start_ms)); 均不存在时为 (None, None)
+    """
+    reader = MarketReader(symbol, 'depth')
+    if len(reader):
+        return ['market'] + reader.signature(), reader.depth_events
+    path = depth_path(symbol)
+    if os.path.exists(path):
+        # 文件持续追加录制, 以大小与修改时间区分版本
+        st = os.stat(path)
+        return ['jsonl', st.st_size, int(st.st_mtime)], lambda start_ms: iter_depth_file(path)
+    return None, None
+
+def cache_key(p, overrides, strategy_hash, data_fp):
+    """任务结果缓存键 (控制台提交前预查与 worker 共用)"""
+    options = {"capital": p.get('capital', 10000), "intrabar": bool(p.get('intrabar'))}
+    if p.get('depth'):
+        options['depth'] = depth_source(p['symbol'])[0]
+    if p.get('source') == 'recorded':
+        options['source'] = 'recorded'
+    return run_key(data_fp, strategy_hash, {**p.get('params', {}), **overrides}, options)
+
+
+def _pack_frame(prefix, df, arrays, meta):
+    cols = []
+    for col in df.columns:
+        s = df[col]
+        name = f"{prefix}.{col}"
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            arrays[name] = s.cat.codes.to_numpy()
+            cols.append([col, 'cat', [str(c) for c in s.cat.categories]])
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            arrays[name] = s.to_numpy(dtype='datetime64[ns]').view('i8')
+            cols.append([col, 'time', None])
+        else:
+            arrays[name] = s.to_numpy()
+            cols.append([col, 'raw', None])
+    meta[prefix] = cols
+
+def _unpack_frame(prefix, data, meta):
+    out = {}
+    for col, kind, cats in meta[prefix]:
+        arr = data[f"{prefix}.{col}"]
+        if kind == 'cat':
+            out[col] = pd.Categorical.from_codes(arr, cats)
+        elif kind == 'time':
+            out[col] = arr.view('datetime64[ns]')
+        else:
+            out[col] = arr
+    return pd.DataFrame(out)
+
+
+class ResultCache:
+    """
+    回测结果缓存 (内容寻址)
+    报告标量 + 成交/权益列数组存为压缩 npz; 文件名带策略名与源码哈希,
+    策略文件改动后旧条目可按名字直接清理; 总大小超限时按最近访问淘汰
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _slug(strategy_name):
+        return re.sub(r'[^0-9A-Za-z_]+', '_', os.path.splitext(strategy_name)[0])
+
+    def _path(self, key, strategy_name, strategy_hash):
+        return os.path.join(self.cache_dir, f"{self._slug(strategy_name)}--{strategy_hash[:12]}--{key}.npz")
+
+    def get(self, key, strategy_name, strategy_hash):
+        path = self._path(key, strategy_name, strategy_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['__meta__']))
+                report = dict(meta['scalars'])
+                report['trades'] = _unpack_frame('trades', data, meta)
+                report['equity'] = _unpack_frame('equity', data, meta)
+        except Exception:
+            return None
+        os.utime(path)  # 记录访问时间, 供淘汰使用
+        return report
+
+    def put(self, key, strategy_name, strategy_hash, report):
+        arrays, meta = {}, {"scalars": {}}
+        for k, v in report.items():
+            if isinstance(v, pd.DataFrame):
+                _pack_frame(k, v, arrays, meta)
+            else:
+                meta['scalars'][k] = v.item() if isinstance(v, np.generic) else v
+        arrays['__meta__'] = np.array(json.dumps(meta, ensure_ascii=False))
+
+        path = self._path(key, strategy_name, strategy_hash)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, path)
+        self._evict()
+
+    def invalidate_strategy(self, strategy_name, current_hash):
+        """删除该策略旧版本源码产生的全部结果"""
+        removed = 0
+        for path in glob.glob(os.path.join(self.cache_dir, f"{self._slug(strategy_name)}--*.npz")):
+            if os.path.basename(path).split('--')[1] != current_hash[:12]:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def _evict(self):
+        files = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*.npz')):
+            try:
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
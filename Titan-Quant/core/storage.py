@@ -22,3 +22,39 @@ class Storage:
             df = pd.DataFrame()
         conn.close()
         return df
+
+    # ---------- 本地K线库 ----------
+    @staticmethod
+    def _ensure_candles(conn):
+        conn.execute("""CREATE TABLE IF NOT EXISTS candles
+                     (symbol TEXT,
+                      timeframe TEXT,
+                      time INTEGER,
+                      open REAL,
+                      high REAL,
+                      low REAL,
+                      close REAL,
+                      volume REAL,
+                      PRIMARY KEY (symbol, timeframe, time))""")
+
+    def save_candles(self, symbol, timeframe, df):
+        """df: time(datetime) / open / high / low / close / volume"""
+        if df is None or df.empty: return
+        times = df['time'].to_numpy(dtype='datetime64[ms]').view('i8').tolist()
+        rows = zip([symbol] * len(df), [timeframe] * len(df), times,
+                   df['open'].tolist(), df['high'].tolist(), df['low'].tolist(), df['close'].tolist(), df['volume'].tolist())
+        conn = sqlite3.connect(self.db_path)
+        self._ensure_candles(conn)
+        conn.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+    def load_candles(self, symbol, timeframe, start_ms, end_ms):
+        """读取 [start_ms, end_ms) 区间的K线"""
+        conn = sqlite3.connect(self.db_path)
+        self._ensure_candles(conn)
+        df = pd.read_sql_query("SELECT time, open, high, low, close, volume FROM candles WHERE symbol=? AND timeframe=? AND time>=? AND time<? ORDER BY time",
+                               conn, params=(symbol, timeframe, start_ms, end_ms))
+        conn.close()
+        df['time'] = pd.to_datetime(df['time'], unit='ms')
+        return df
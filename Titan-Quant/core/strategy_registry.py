@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import types
+import hashlib
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+from core.base_strategy import BaseStrategy
+
+# 确保路径兼容性
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STRATEGY_DIR = os.path.join(BASE_DIR, 'strategies')
+GATE_FILE = os.path.join(BASE_DIR, 'data', 'strategy_gate.json')
+
+# 准入门槛 (可被 config.json 的 strategy_gate 覆盖)
+DEFAULT_GATE = {
+    "bars": 2000,              # 合成数据长度
+    "min_bars_per_sec": 1000,  # 逐K线吞吐下限
+    "max_memory_mb": 512,      # 内存峰值上限
+    "lookahead_samples": 12,   # 未来函数抽查次数
+    "timeout": 30              # 单次验证最长秒数 (需小于 job_queue.STALE_AFTER)
+}
+
+
+class StrategyRejected(Exception):
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f"策略未通过准入检查: {'; '.join(report['errors'])}")
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+def file_hash(path):
+    """策略文件源码哈希 (不做准入检查, 与 StrategyRegistry.source_hash 结果一致)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return source_hash(f.read())
+
+def load_class_from_source(source, name='dynamic_strategy'):
+    """执行策略源码并返回 BaseStrategy 子类"""
+    module = types.ModuleType(name)
+    exec(compile(source, name, 'exec'), module.__dict__)
+    for obj in module.__dict__.values():
+        if isinstance(obj, type) and issubclass(obj, BaseStrategy) and obj is not BaseStrategy:
+            return obj
+    return None
+
+def synthetic_ohlcv(n, seed=7):
+    """随机游走合成K线"""
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.002, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.002, n)))
+    return pd.DataFrame({
+        'time': pd.date_range('2024-01-01', periods=n, freq='1h'),
+        'open': open_, 'high': high, 'low': low, 'close': close,
+        'volume': rng.uniform(10, 1000, n)
+    })
+
+def _signal_key(res):
+    res = res or {}
+    return (res.get('signal'), round(float(res.get('stop_loss') or 0), 6), round(float(res.get('take_profit') or 0), 6))
+
+def _failed_report(error, retryable=False):
+    return {"ok": False, "bars_per_sec": 0.0, "peak_mb": 0.0, "lookahead": False, "errors": [error], "retryable": retryable}
+
+def benchmark(source, params, gate):
+    """在合成数据上测吞吐 / 内存峰值 / 未来函数"""
+    report = {"ok": False, "bars_per_sec": 0.0, "peak_mb": 0.0, "lookahead": False, "errors": [], "retryable": False}
+    try:
+        StratClass = load_class_from_source(source)
+        if StratClass is None:
+            report['errors'].append("未找到 BaseStrategy 子类")
+            return report
+        strat = StratClass(params)
+        raw = synthetic_ohlcv(gate['bars'])
+
+        # 1. 吞吐 (不开 tracemalloc, 避免拖慢计时)
+        t0 = time.perf_counter()
+        df = strat.add_indicators(raw.copy())
+        signals = {}
+        for i in range(50, len(df)):
+            signals[i] = _signal_key(strat.on_bar(df, i))
+        elapsed = time.perf_counter() - t0
+        report['bars_per_sec'] = (len(df) - 50) / max(elapsed, 1e-9)
+
+        # 内存峰值: 指标计算 + 一小段逐K线
+        tracemalloc.start()
+        part = strat.add_indicators(raw.copy())
+        for i in range(50, min(len(part), 250)):
+            strat.on_bar(part, i)
+        report['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+        # 2. 未来函数: 截断数据后同一根K线的信号必须不变
+        samples = np.linspace(60, len(raw) - 2, gate['lookahead_samples']).astype(int)
+        for i in samples:
+            part = strat.add_indicators(raw.iloc[:i + 1].copy())
+            try:
+                same = _signal_key(strat.on_bar(part, i)) == signals[i]
+            except IndexError:
+                same = False
+            if not same:
+                report['lookahead'] = True
+                report['errors'].append(f"疑似未来函数 (第 {i} 根K线信号依赖后续数据)")
+                break
+    except Exception as e:
+        if tracemalloc.is_tracing(): tracemalloc.stop()
+        report['errors'].append(f"运行异常: {e}")
+        return report
+
+    slow = report['bars_per_sec'] < gate['min_bars_per_sec']
+    if slow:
+        report['errors'].append(f"吞吐过低: {report['bars_per_sec']:.0f} bars/s < {gate['min_bars_per_sec']}")
+    if report['peak_mb'] > gate['max_memory_mb']:
+        report['errors'].append(f"内存峰值过高: {report['peak_mb']:.0f}MB > {gate['max_memory_mb']}MB")
+    report['ok'] = not report['errors']
+    # 吞吐随机器负载波动: 仅因吞吐不达标时不算定论, 下次重新测
+    report['retryable'] = slow and len(report['errors']) == 1
+    return report
+
+
+class StrategyRegistry:
+    """
+    策略注册表
+    按文件 mtime + 内容哈希缓存已编译的策略类; 新内容首次激活前
+    在独立进程中跑准入检查 (防止死循环拖死控制台), 确定性的结果按哈希持久化
+    """
+    def __init__(self, strategy_dir=STRATEGY_DIR, gate=None, params=None, gate_file=GATE_FILE):
+        self.strategy_dir = strategy_dir
+        self.gate = dict(DEFAULT_GATE, **(gate or {}))
+        self.params = params or {}
+        self.gate_file = gate_file
+        self._classes = {}  # filename -> (mtime, hash, cls)
+
+    def _load_gate_cache(self):
+        if not os.path.exists(self.gate_file): return {}
+        try:
+            with open(self.gate_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def _save_gate_result(self, digest, report):
+        cache = self._load_gate_cache()
+        cache[digest] = report
+        os.makedirs(os.path.dirname(self.gate_file), exist_ok=True)
+        tmp = self.gate_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp, self.gate_file)
+
+    def validate(self, source):
+        """准入检查 (按 源码+门槛 哈希缓存); 返回报告 dict"""
+        digest = source_hash(source + json.dumps([self.gate, self.params], sort_keys=True))
+        cached = self._load_gate_cache().get(digest)
+        # 旧版本缓存没有 retryable 标记, 可能是超时等偶发失败, 重新验证一次
+        if cached and 'retryable' in cached:
+            return cached
+
+        # 子进程执行, 超时直接杀掉 (不依赖 multiprocessing, Streamlit 下同样安全)
+        job = json.dumps({"source": source, "params": self.params, "gate": self.gate})
+        try:
+            proc = subprocess.run([sys.executable, '-m', 'core.strategy_registry'], input=job, cwd=BASE_DIR,
+                                  capture_output=True, text=True, encoding='utf-8', timeout=self.gate['timeout'])
+            lines = proc.stdout.strip().splitlines()
+            report = json.loads(lines[-1]) if lines else None
+        except subprocess.TimeoutExpired:
+            report = _failed_report(f"验证超时 (>{self.gate['timeout']}s), 疑似死循环或逐行计算过慢", retryable=True)
+        except ValueError:
+            report = None
+        if report is None:
+            # 验证进程本身异常 (环境问题), 不缓存
+            return _failed_report(f"验证进程异常: {proc.stderr.strip()[-300:]}", retryable=True)
+        # 超时 / 吞吐不达标可能只是负载尖峰, 不持久化, 避免未改动的策略被永久拒绝
+        if not report['retryable']:
+            self._save_gate_result(digest, report)
+        return report
+
+    def source_hash(self, filename):
+        self.get(filename)
+        return self._classes[filename][1]
+
+    def get(self, filename):
+        """返回策略类; 文件未变化时直接命中缓存, 未通过准入则抛出 StrategyRejected"""
+        path = os.path.join(self.strategy_dir, filename)
+        mtime = os.path.getmtime(path)
+        cached = self._classes.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[2]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        digest = source_hash(source)
+        if cached and cached[1] == digest:
+            self._classes[filename] = (mtime, digest, cached[2])
+            return cached[2]
+
+        report = self.validate(source)
+        if not report['ok']:
+            raise StrategyRejected(report)
+        cls = load_class_from_source(source, f"strategy_{digest[:12]}")
+        self._classes[filename] = (mtime, digest, cls)
+        return cls
+
+
+if __name__ == "__main__":
+    # 子进程入口: stdin 读入 {source, params, gate}, 最后一行输出 JSON 报告
+    job = json.loads(sys.stdin.read())
+    print(json.dumps(benchmark(job['source'], job['params'], job['gate']), ensure_ascii=False))
@@ -1,11 +1,16 @@
 import time
 import json
 import os
+import atexit
 import logging
 from core.data_engine import DataEngine
 from core.strategy_engine import StrategyEngine
 from core.command_bridge import CommandBridge
 from core.ai_guardian import AIGuardian
+from core.execution_router import ExecutionRouter
+from core.equity_store import EquityStore
+from core.log_pipeline import setup_logging, log_stats
+from core.profiler import Profiler
 
 # 路径配置
 ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -18,20 +23,22 @@ STATUS_FILE = os.path.join(ROOT, 'data', 'status.json')
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 os.makedirs(os.path.dirname(STATUS_FILE), exist_ok=True)
 
-# 日志配置
-logging.basicConfig(
-    filename=LOG_FILE, 
-    level=logging.INFO, 
-    format='%(asctime)s - %(message)s',
-    encoding='utf-8'
-)
+# 日志配置: 有界队列 + 后台线程写盘, 扫描循环内不做同步 IO
+log = logging.getLogger('titan')
 
 def load_json(path):
     with open(path, 'r', encoding='utf-8') as f: return json.load(f)
 
 def main():
-    print("🚀 Titan-Quant Core Started.")
-    logging.info("System Initialized")
+    listener = setup_logging(LOG_FILE)
+    # 任何方式退出 (含错误重试等待中的 Ctrl-C) 都先刷完队列中剩余日志
+    atexit.register(listener.stop)
+    log.info("🚀 Titan-Quant Core Started.", extra={'stage': 'init'})
+    router, router_key = None, None
+    # 权益快照由后台线程批量写库, 扫描循环内只入队
+    equity_store = EquityStore().start()
+    atexit.register(equity_store.stop)
+    profiler = Profiler()  # 由 PROFILE_START / PROFILE_STOP 指令开关, 未开启时无任何开销
     
     while True:
         try:
@@ -42,13 +49,20 @@ def main():
             # 2. 响应前端指令
             cmd = CommandBridge.read_command()
             if cmd:
-                print(f"⚡ 收到指令: {cmd['command']}")
-                logging.info(f"Command: {cmd['command']}")
-                # 实例化引擎处理平仓指令
-                temp_eng = DataEngine('cmd', config['exchanges']['binance_main'], secrets['exchanges']['binance_main'])
-                if cmd['command'] == "CLOSE_ALL":
+                log.info("⚡ 收到指令: %s", cmd['command'], extra={'stage': 'command'})
+                if cmd['command'] == "PROFILE_START":
+                    params = cmd.get('params', {})
+                    profiler.start(params.get('mode', 'sample'), tag='live', duration=params.get('duration'))
+                elif cmd['command'] == "PROFILE_STOP":
+                    log.info("Profile saved: %s", profiler.stop(), extra={'stage': 'profile'})
+                elif cmd['command'] == "CLOSE_ALL":
+                    # 实例化引擎处理平仓指令
+                    temp_eng = DataEngine('cmd', config['exchanges']['binance_main'], secrets['exchanges']['binance_main'])
                     msg = temp_eng.close_all(config['strategy']['symbol'])
-                    logging.info(msg)
+                    log.info(msg, extra={'stage': 'command'})
+
+            if profiler.active and profiler.expired():
+                log.info("Profile saved: %s", profiler.stop(), extra={'stage': 'profile'})
 
             # 3. 检查开关
             if not config['system']['is_running']:
@@ -60,15 +74,26 @@ def main():
             ex_sec = secrets['exchanges']['binance_main']
             symbol = config['strategy']['symbol']
             
+            t0 = time.perf_counter()
             engine = DataEngine('binance', ex_conf, ex_sec)
             df = engine.fetch_ohlcv(symbol, config['strategy']['timeframe'])
             
             if df is None:
-                print("获取行情失败...")
+                log.warning("获取行情失败...", extra={'symbol': symbol, 'stage': 'fetch', 'latency': time.perf_counter() - t0})
                 time.sleep(5)
                 continue
                 
             res = StrategyEngine.analyze(df, config['strategy'])
+            scan_latency = time.perf_counter() - t0
+
+            # 多账户执行路由: 账户列表或密钥变化时重建, 扫描间隙预热余额/持仓/杠杆
+            live = config['system'].get('live_trading', False)
+            if live:
+                key = json.dumps([config['system'].get('accounts'), secrets['exchanges'], symbol], sort_keys=True)
+                if key != router_key:
+                    if router: router.close()
+                    router, router_key = ExecutionRouter.from_config(config, secrets, symbol), key
+                router.refresh_accounts()
             
             # 5. 更新状态文件
             status_data = {
@@ -76,23 +101,33 @@ def main():
                 "adx": res['indicators']['adx'],
                 "signal": res['signal'],
                 "reason": res['reason'],
-                "balance": "API未配"
+                "balance": "API未配",
+                "log": log_stats()
             }
             try:
                 if ex_sec['apiKey']:
-                    bal = engine.client.fetch_balance()['USDT']['free']
-                    status_data['balance'] = round(bal, 2)
+                    bal = engine.fetch_balance()['USDT']
+                    status_data['balance'] = round(bal['free'], 2)
+                    # 权益快照: 钱包余额 + 未实现盈亏 + 持仓 (后台线程写库并更新 1m/1h/1d 聚合)
+                    positions = [p for p in engine.fetch_positions([symbol]) if float(p['contracts'] or 0) > 0]
+                    upnl = sum(float(p.get('unrealizedPnl') or 0) for p in positions)
+                    equity_store.raw_interval = config['system']['check_interval']
+                    # U本位合约的 total 为保证金余额 (已含未实现盈亏), 扣回得到钱包余额, 避免重复计入
+                    equity_store.record('binance_main', float(bal['total']) - upnl, upnl,
+                                        [{"symbol": p['symbol'], "side": p['side'], "contracts": float(p['contracts']),
+                                          "entry": float(p['entryPrice'] or 0)} for p in positions])
             except:
                 pass
                 
             with open(STATUS_FILE, 'w', encoding='utf-8') as f:
                 json.dump(status_data, f)
             
-            print(f"扫描完成: ADX={res['indicators']['adx']:.1f} | 信号: {res['signal']}")
+            log.info("扫描完成: ADX=%.1f", res['indicators']['adx'],
+                     extra={'symbol': symbol, 'stage': 'scan', 'latency': scan_latency, 'signal': res['signal']})
 
             # 6. 信号触发
             if res['signal']:
-                logging.info(f"SIGNAL FOUND: {res['signal']} @ {res['entry_price']}")
+                log.info("SIGNAL FOUND @ %s", res['entry_price'], extra={'symbol': symbol, 'stage': 'signal', 'signal': res['signal']})
                 
                 # AI 过滤
                 allow = True
@@ -101,17 +136,23 @@ def main():
                     ai_res = ai.review(df, res['signal'])
                     if not ai_res['approved']:
                         allow = False
-                        logging.info(f"AI REJECTED: {ai_res['reason']}")
+                        log.info("AI REJECTED: %s", ai_res['reason'], extra={'symbol': symbol, 'stage': 'ai', 'signal': res['signal']})
                 
-                if allow:
-                    # engine.execute_order(...)
-                    logging.info("执行开单逻辑 (Simulation Mode)")
+                if allow and live:
+                    results = router.dispatch(res)
+                    for name, r in results.items():
+                        extra = {'symbol': symbol, 'stage': 'execute', 'latency': r.get('latency'), 'signal': res['signal']}
+                        if r.get('ok'):
+                            log.info("[%s] FILLED qty=%s", name, r['qty'], extra=extra)
+                        else:
+                            log.warning("[%s] FAILED: %s", name, r.get('error'), extra=extra)
+                elif allow:
+                    log.info("执行开单逻辑 (Simulation Mode)", extra={'symbol': symbol, 'stage': 'execute', 'signal': res['signal']})
 
             time.sleep(config['system']['check_interval'])
 
         except Exception as e:
-            print(f"Main Loop Error: {e}")
-            logging.error(f"Error: {e}")
+            log.error("Main Loop Error: %s", e, extra={'stage': 'loop'})
             time.sleep(10)
 
 if __name__ == "__main__":
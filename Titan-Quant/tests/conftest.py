@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接导入 core.* (与 main.py / dashboard 的路径处理一致)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,94 @@
+import sys
+import types
+import numpy as np
+import pytest
+
+try:
+    import pandas_ta  # noqa: F401
+except ImportError:
+    # core.base_strategy 导入 pandas_ta 只为注册 df.ta; 本文件的策略只用 pandas 原生指标
+    sys.modules['pandas_ta'] = types.ModuleType('pandas_ta')
+
+from core.base_strategy import BaseStrategy
+from core.backtest_engine import BacktestEngine, WARMUP_BARS
+from core.strategy_registry import synthetic_ohlcv
+
+
+class EmaStrategy(BaseStrategy):
+    """只用因果指标 (EMA / 滚动均值), 追加K线不改变历史信号"""
+    def add_indicators(self, df):
+        df['ema'] = df['close'].ewm(span=20, adjust=False).mean()
+        df['atr'] = (df['high'] - df['low']).rolling(14).mean()
+        return df
+
+    def on_bar(self, df, i):
+        prev, close = df.iloc[i - 1], df['close'].iloc[i]
+        if prev['close'] > prev['ema'] * 1.002:
+            return {'signal': 'LONG', 'stop_loss': close - 2 * prev['atr'], 'take_profit': close + 3 * prev['atr'], 'reason': ''}
+        if prev['close'] < prev['ema'] * 0.998:
+            return {'signal': 'SHORT', 'stop_loss': close + 2 * prev['atr'], 'take_profit': close - 3 * prev['atr'], 'reason': ''}
+        return {'signal': None, 'stop_loss': 0, 'take_profit': 0, 'reason': ''}
+
+
+def run_in_steps(df, cuts):
+    """先跑 df[:cuts[0]], 再逐段续跑到 cuts[1:], 最后到全量"""
+    state = None
+    for end in list(cuts) + [len(df)]:
+        engine = BacktestEngine()
+        report = engine.run(df.iloc[:end].reset_index(drop=True), EmaStrategy(), state=state)
+        state = engine.get_state()
+    return engine, report
+
+def assert_same(full, resumed):
+    full_engine, full_report = full
+    engine, report = resumed
+    assert engine.balance == pytest.approx(full_engine.balance, rel=1e-12)
+    for key in ('final_balance', 'total_trades', 'win_rate', 'profit_factor', 'max_drawdown'):
+        assert report[key] == pytest.approx(full_report[key], rel=1e-9), key
+    a, b = report['trades'], full_report['trades']
+    assert len(a) == len(b)
+    for col in a.columns:
+        np.testing.assert_array_equal(a[col].to_numpy(), b[col].to_numpy(), err_msg=col)
+
+def open_position_cut(df, start, stop):
+    """找一个回测结束时仍有持仓的切点"""
+    for end in range(start, stop):
+        engine = BacktestEngine()
+        engine.run(df.iloc[:end].reset_index(drop=True), EmaStrategy())
+        if engine.position is not None:
+            return end
+    pytest.fail("没有找到持仓中的切点")
+
+
+@pytest.fixture(scope='module')
+def data():
+    df = synthetic_ohlcv(3000)
+    engine = BacktestEngine()
+    return df, (engine, engine.run(df, EmaStrategy()))
+
+def test_resume_n_plus_k_plus_k(data):
+    df, full = data
+    assert_same(full, run_in_steps(df, [2000, 2400]))
+
+def test_resume_with_open_position(data):
+    df, full = data
+    cut = open_position_cut(df, 1500, 1700)
+    assert_same(full, run_in_steps(df, [cut, cut + 300]))
+
+def test_resume_rejects_discontinuous_data(data):
+    df, _ = data
+    engine = BacktestEngine()
+    engine.run(df.iloc[:1000], EmaStrategy())
+    state = engine.get_state()
+    with pytest.raises(ValueError):
+        BacktestEngine().run(df.iloc[1200:].reset_index(drop=True), EmaStrategy(), state=state)
+
+def test_resume_rejects_truncated_history(data):
+    df, _ = data
+    engine = BacktestEngine()
+    engine.run(df.iloc[:1000], EmaStrategy())
+    state = engine.get_state()
+    # 只传尾部窗口: 上次最后一根K线之前不足预热期
+    window = df.iloc[1000 - WARMUP_BARS + 20:1100].reset_index(drop=True)
+    with pytest.raises(ValueError):
+        BacktestEngine().run(window, EmaStrategy(), state=state)
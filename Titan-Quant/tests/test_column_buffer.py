@@ -0,0 +1,25 @@
+import json
+import numpy as np
+
+from core.column_buffer import ColumnBuffer
+
+COLUMNS = {'time': 'i8', 'equity': 'f4'}
+
+
+def test_memmap_buffer_grows_and_reopens(tmp_path):
+    path = str(tmp_path / 'rec.equity')
+    buf = ColumnBuffer(COLUMNS, 4, path)
+    for i in range(10):
+        buf.append(i, i * 1.5)
+    assert buf.capacity == 16
+    np.testing.assert_array_equal(buf.column('time'), np.arange(10))
+
+    # 同一路径重建前先释放旧映射
+    buf.close()
+    with open(f"{path}.json", 'r', encoding='utf-8') as f:
+        assert json.load(f)['size'] == 10
+    buf = ColumnBuffer(COLUMNS, 4, path)
+    buf.append(7, 1.0)
+    buf.flush()
+    assert len(buf) == 1 and buf.column('time').tolist() == [7]
+    assert np.load(f"{path}.time.npy", mmap_mode='r')[0] == 7
@@ -0,0 +1,38 @@
+import pytest
+
+from core.equity_store import EquityStore
+
+T0 = 1_699_999_980  # 整分钟
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EquityStore(str(tmp_path / 'equity.db'))
+
+def test_background_writer_matches_sync_writes(store, tmp_path):
+    sync = EquityStore(str(tmp_path / 'sync.db'))
+    bg = store.start()
+    samples = [(T0 + i * 10, 1000.0 + i, (-1) ** i * 5.0) for i in range(30)]
+    for ts, balance, upnl in samples:
+        sync.record('acct', balance, upnl, ts=ts)
+        bg.record('acct', balance, upnl, [{"symbol": "BTC/USDT"}], ts=ts)
+    bg.stop()
+    assert bg.dropped == 0
+
+    for res in ('1m', '1h'):
+        a = bg.query('acct', T0, T0 + 300, max_points=1 if res == '1h' else 10)
+        b = sync.query('acct', T0, T0 + 300, max_points=1 if res == '1h' else 10)
+        assert a[0] == b[0] == res
+        assert a[1].equals(b[1])
+    # 1m 桶: 第一分钟的 6 个快照
+    _, df = bg.query('acct', T0, T0 + 300, max_points=10)
+    first = [b + u for _, b, u in samples[:6]]
+    assert (df['open'][0], df['high'][0], df['low'][0], df['close'][0]) == (first[0], max(first), min(first), first[-1])
+    assert bg.latest('acct')['positions'] == [{"symbol": "BTC/USDT"}]
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    store = EquityStore(str(tmp_path / 'equity.db'), queue_size=2)
+    store._thread = object()  # 模拟写线程卡在慢磁盘上
+    for i in range(5):
+        store.record('acct', 1000.0, ts=T0 + i)
+    assert store.dropped == 3 and store.queue.qsize() == 2
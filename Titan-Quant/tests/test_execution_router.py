@@ -0,0 +1,122 @@
+import sys
+import types
+import threading
+import pytest
+
+try:
+    import pandas_ta  # noqa: F401
+except ImportError:
+    # core.data_engine 导入 pandas_ta 只为注册 df.ta; 路由测试不计算指标
+    sys.modules['pandas_ta'] = types.ModuleType('pandas_ta')
+
+from core.execution_engine import ExecutionEngine, BALANCE_TTL
+from core.execution_router import ExecutionRouter
+from core.rate_limiter import RateLimiter
+
+SYMBOL = 'BTC/USDT:USDT'
+SIGNAL = {'signal': 'LONG', 'entry_price': 100.0, 'stop_loss': 95.0, 'take_profit': 110.0}
+
+
+class FakeExchange:
+    """本地模拟交易所: 记录每个接口的调用次数, 可注入下单钩子"""
+    def __init__(self, balance=1000.0, on_order=None):
+        self.balance = balance
+        self.on_order = on_order
+        self.calls = {}
+        self.orders = []
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def fetch_balance(self):
+        self._count('fetch_balance')
+        return {'USDT': {'free': self.balance, 'total': self.balance}}
+
+    def fetch_positions(self, symbols):
+        self._count('fetch_positions')
+        return []
+
+    def set_leverage(self, leverage, symbol):
+        self._count('set_leverage')
+
+    def amount_to_precision(self, symbol, qty):
+        return f"{qty:.3f}"
+
+    def create_market_order(self, symbol, side, qty):
+        self._count('create_market_order')
+        if self.on_order:
+            self.on_order()
+        self.orders.append((side, qty))
+        return {'id': len(self.orders), 'side': side, 'amount': qty}
+
+    def create_order(self, symbol, type, side, qty, params=None):
+        self._count('create_order')
+        return {'type': type, 'side': side, 'amount': qty, 'params': params}
+
+
+def make_router(exchanges, limiter=None):
+    return ExecutionRouter({name: ExecutionEngine(ex, SYMBOL, limiter=limiter, account=name)
+                            for name, ex in exchanges.items()})
+
+
+def test_dispatch_runs_accounts_in_parallel():
+    # 三个账户必须同时进入下单才能通过栅栏, 串行执行会超时
+    barrier = threading.Barrier(3, timeout=5)
+    exchanges = {f"acct{i}": FakeExchange(on_order=barrier.wait) for i in range(3)}
+    router = make_router(exchanges)
+    try:
+        results = router.dispatch(SIGNAL)
+    finally:
+        router.close()
+    assert all(r['ok'] for r in results.values()), results
+    assert all(ex.calls['create_market_order'] == 1 for ex in exchanges.values())
+
+def test_failing_account_does_not_block_others():
+    def reject():
+        raise RuntimeError("insufficient margin")
+    exchanges = {'good1': FakeExchange(), 'bad': FakeExchange(on_order=reject), 'good2': FakeExchange()}
+    router = make_router(exchanges)
+    try:
+        results = router.dispatch(SIGNAL)
+    finally:
+        router.close()
+    assert results['good1']['ok'] and results['good2']['ok']
+    assert not results['bad']['ok'] and 'insufficient margin' in results['bad']['error']
+    assert results['good1']['qty'] > 0 and 'latency' in results['good1']
+
+def test_refresh_keeps_order_path_free_of_extra_requests():
+    ex = FakeExchange()
+    router = make_router({'main': ex})
+    try:
+        router.refresh_accounts()
+        assert ex.calls == {'set_leverage': 1, 'fetch_positions': 1, 'fetch_balance': 1}
+        results = router.dispatch(SIGNAL)
+    finally:
+        router.close()
+    assert results['main']['ok']
+    # 余额/持仓/杠杆均来自扫描间隙的预热, 信号到来后只发下单请求
+    assert ex.calls == {'set_leverage': 1, 'fetch_positions': 1, 'fetch_balance': 1,
+                        'create_market_order': 1, 'create_order': 2}
+
+def test_balance_ttl_cache():
+    ex = FakeExchange()
+    eng = ExecutionEngine(ex, SYMBOL)
+    assert eng.refresh_balance() == 1000.0
+    ex.balance = 500.0
+    assert eng.refresh_balance() == 1000.0
+    assert ex.calls['fetch_balance'] == 1
+    # 过期后重新拉取
+    eng.balance_ts -= BALANCE_TTL + 1
+    assert eng.refresh_balance() == 500.0
+    assert ex.calls['fetch_balance'] == 2
+
+def test_accounts_queue_as_separate_waiters(tmp_path):
+    limiter = RateLimiter('test', db_path=str(tmp_path / 'limit.db'))
+    router = make_router({'a': FakeExchange(), 'b': FakeExchange()}, limiter=limiter)
+    try:
+        ids = {name: eng.waiter_id for name, eng in router.engines.items()}
+        assert len(set(ids.values())) == 2 and limiter.waiter_id not in ids.values()
+        results = router.dispatch(SIGNAL)
+    finally:
+        router.close()
+    assert all(r['ok'] for r in results.values()), results
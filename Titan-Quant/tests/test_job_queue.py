@@ -0,0 +1,41 @@
+import time
+import pytest
+
+from core.job_queue import JobQueue, JobLost, STALE_AFTER
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'))
+
+def expire(queue, job_id):
+    """把心跳拨回到僵死判定之前"""
+    conn = queue._conn()
+    conn.execute("UPDATE jobs SET heartbeat=? WHERE id=?", (time.time() - STALE_AFTER - 1, job_id))
+    conn.close()
+
+def test_reclaimed_job_rejects_previous_owner(queue):
+    job_id = queue.submit('backtest', {})
+    first = queue.claim('w1')
+    expire(queue, job_id)
+    second = queue.claim('w2')
+    assert second['id'] == job_id and second['token'] != first['token']
+
+    # 旧 worker 的心跳与结束都不再生效
+    assert not queue.touch(job_id, first['token'])
+    with pytest.raises(JobLost):
+        queue.heartbeat(job_id, 0.5, token=first['token'])
+    assert not queue.finish(job_id, 'done', token=first['token'])
+    assert queue.get_job(job_id)['status'] == 'running'
+
+    assert queue.finish(job_id, 'done', token=second['token'])
+    assert queue.get_job(job_id)['status'] == 'done'
+
+def test_touch_keeps_job_from_being_reclaimed(queue):
+    job_id = queue.submit('backtest', {})
+    job = queue.claim('w1')
+    expire(queue, job_id)
+    assert queue.touch(job_id, job['token'])
+    assert queue.claim('w2') is None
+    queue.heartbeat(job_id, 0.5, 'x', token=job['token'])
+    assert queue.get_job(job_id)['progress'] == 0.5
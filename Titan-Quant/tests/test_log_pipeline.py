@@ -0,0 +1,30 @@
+import time
+import queue
+import logging
+
+from core.log_pipeline import DrainingQueueListener
+
+
+class SlowSink(logging.Handler):
+    """模拟慢磁盘"""
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        time.sleep(0.001)
+        self.lines.append(record.getMessage())
+
+
+def test_stop_with_full_queue_flushes_everything():
+    q = queue.Queue(maxsize=50)
+    sink = SlowSink()
+    listener = DrainingQueueListener(q, sink)
+    listener.start()
+    n = 0
+    while not q.full():  # 只有本线程写入, 检查后 put_nowait 不会满
+        q.put_nowait(logging.makeLogRecord({'msg': f"line {n}"}))
+        n += 1
+    listener.stop()  # 默认实现此处抛 queue.Full
+    assert len(sink.lines) == n
+    assert sorted(sink.lines, key=lambda s: int(s.split()[1])) == [f"line {i}" for i in range(n)]
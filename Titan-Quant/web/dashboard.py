@@ -3,7 +3,6 @@ import pandas as pd
 import json
 import os
 import sys
-import importlib.util
 import time
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -13,8 +12,12 @@ ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT)
 
 from core.data_engine import DataEngine
-from core.backtest_engine import BacktestEngine
-from core.base_strategy import BaseStrategy
+from core.command_bridge import CommandBridge
+from core.job_queue import JobQueue
+from core.strategy_registry import StrategyRegistry, file_hash
+from core.result_cache import ResultCache, cache_key, range_fingerprint, expected_end_ms
+from core.equity_store import EquityStore
+from core.downsample import downsample_line, downsample_ohlc, visible_window
 
 # --- 页面配置 ---
 st.set_page_config(
@@ -38,6 +41,8 @@ CONFIG_PATH = os.path.join(ROOT, 'config', 'config.json')
 SECRETS_PATH = os.path.join(ROOT, 'config', 'secrets.json')
 STRATEGY_DIR = os.path.join(ROOT, 'strategies')
 os.makedirs(STRATEGY_DIR, exist_ok=True)
+job_queue = JobQueue()
+result_cache = ResultCache()
 
 # --- 工具函数 ---
 def load_json(path):
@@ -47,23 +52,17 @@ def load_json(path):
 def save_json(path, data):
     with open(path, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
 
+@st.cache_resource
+def get_registry():
+    """策略注册表 (跨会话共享已编译策略与准入结果)"""
+    conf = load_json(CONFIG_PATH)
+    return StrategyRegistry(STRATEGY_DIR, gate=conf.get('strategy_gate'), params=conf.get('strategy'))
+
 def load_strategies():
     """扫描策略文件"""
     files = [f for f in os.listdir(STRATEGY_DIR) if f.endswith('.py') and f not in ['__init__.py']]
     return files
 
-def get_strategy_class(filename):
-    """动态导入策略类"""
-    path = os.path.join(STRATEGY_DIR, filename)
-    spec = importlib.util.spec_from_file_location("dynamic_strategy", path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    # 查找 BaseStrategy 的子类
-    for name, obj in module.__dict__.items():
-        if isinstance(obj, type) and issubclass(obj, BaseStrategy) and obj is not BaseStrategy:
-            return obj
-    return None
-
 # ==========================================
 #              侧边栏导航
 # ==========================================
@@ -87,6 +86,36 @@ if nav == "📈 市场监控 (Live)":
     c3.metric("ADX 动能", f"{status.get('adx', 0):.1f}")
     c4.metric("账户权益", f"${status.get('balance', '---')}")
     
+    # 实盘权益曲线 (按可视区间选择聚合粒度, 点数有上限)
+    st.subheader("账户权益")
+    span = st.radio("区间", ["6小时", "1天", "7天", "30天", "全部"], index=1, horizontal=True)
+    span_secs = {"6小时": 6 * 3600, "1天": 86400, "7天": 7 * 86400, "30天": 30 * 86400, "全部": None}[span]
+    now = time.time()
+    res, eq = EquityStore().query('binance_main', start=now - span_secs if span_secs else None, end=now)
+    if eq.empty:
+        st.caption("暂无权益快照 (需配置 API Key 并启动 main.py)")
+    else:
+        fig = go.Figure()
+        if res == 'raw':
+            fig.add_trace(go.Scatter(x=eq['time'], y=eq['close'], mode='lines', name='权益', line=dict(color='#00ff88')))
+        else:
+            fig.add_trace(go.Candlestick(x=eq['time'], open=eq['open'], high=eq['high'], low=eq['low'], close=eq['close'], name=f'权益 ({res})'))
+        fig.update_layout(template='plotly_dark', height=300, margin=dict(l=0,r=0,t=0,b=0), xaxis_rangeslider_visible=False)
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"粒度: {res} · {len(eq)} 点")
+
+    # 性能剖析 (后端按指令开启采样剖析, 到时自动停止, 文件写入 logs/profiles)
+    with st.expander("🔍 性能剖析"):
+        p1, p2, p3 = st.columns(3)
+        prof_mode = p1.selectbox("模式", ["sample", "cprofile"], help="sample 为低开销采样, 适合实盘")
+        prof_secs = p2.number_input("时长 (秒)", 10, 3600, 60)
+        if p3.button("▶️ 开始剖析"):
+            CommandBridge.send_command("PROFILE_START", {"mode": prof_mode, "duration": prof_secs})
+            st.toast("剖析指令已发送")
+        if p3.button("⏹ 停止剖析"):
+            CommandBridge.send_command("PROFILE_STOP")
+            st.toast("停止指令已发送")
+
     # 交互式图表
     st.subheader("实时行情")
     config = load_json(CONFIG_PATH)
@@ -98,6 +127,7 @@ if nav == "📈 市场监控 (Live)":
                 eng = DataEngine('view', config['exchanges']['binance_main'], secrets['exchanges']['binance_main'])
                 df = eng.fetch_ohlcv(config['strategy']['symbol'], config['strategy']['timeframe'], limit=100)
                 if df is not None:
+                    df = downsample_ohlc(df)
                     fig = go.Figure(data=[go.Candlestick(x=df['time'], open=df['open'], high=df['high'], low=df['low'], close=df['close'], name='K线')])
                     fig.update_layout(template='plotly_dark', height=500, margin=dict(l=0,r=0,t=0,b=0))
                     st.plotly_chart(fig, use_container_width=True)
@@ -122,35 +152,74 @@ elif nav == "🧪 回测实验室 (Backtest)":
             strategy_files = load_strategies()
             selected_strat = st.selectbox("选择策略", strategy_files)
     
+        grid_text = st.text_input("参数扫描 (可选, JSON)", "", placeholder='{"sl_atr_mult": [1.5, 2.0], "tp_atr_mult": [6, 8]}')
+        intrabar = st.checkbox("🔬 高精度撮合 (SL/TP 同K线双触时下钻 1m 数据)", value=False)
+        source = st.radio("数据来源", ["交易所", "本地录制"], horizontal=True, help="本地录制: python -m core.market_recorder 采集的已收盘K线")
+        depth = st.checkbox("📚 盘口滑点 (使用录制的深度数据)", value=False)
+        profile = st.checkbox("🔍 性能剖析 (cProfile, 跳过缓存)", value=False)
+
     if st.button("🚀 启动回测引擎", type="primary"):
         if not selected_strat:
             st.warning("请先选择一个策略！")
         else:
-            with st.status("回测进行中...", expanded=True) as status:
-                # 1. 获取数据
-                st.write("📡 正在从 Binance 拉取历史数据...")
+            try:
+                grid = json.loads(grid_text) if grid_text.strip() else {}
+            except ValueError as e:
+                grid = None
+                st.error(f"参数扫描格式错误: {e}")
+            if grid is not None:
                 conf = load_json(CONFIG_PATH)
-                sec = load_json(SECRETS_PATH)
-                eng = DataEngine('backtest', conf['exchanges']['binance_main'], sec['exchanges']['binance_main'])
-                df = eng.fetch_ohlcv(symbol, timeframe, limit=limit)
-                
-                if df is not None:
-                    # 2. 初始化策略
-                    st.write("⚙️ 正在编译策略逻辑...")
-                    StratClass = get_strategy_class(selected_strat)
-                    # 从配置中读取参数传递给策略
-                    strat_instance = StratClass(conf['strategy'])
-                    
-                    # 3. 运行引擎
-                    st.write("⚡ 正在模拟逐笔交易...")
-                    engine = BacktestEngine(initial_capital=balance)
-                    result = engine.run(df, strat_instance)
-                    
-                    status.update(label="回测完成!", state="complete", expanded=False)
-                    st.session_state['bt_result'] = result
+                payload = {
+                    "symbol": symbol, "timeframe": timeframe, "limit": limit,
+                    "strategy": selected_strat, "params": conf['strategy'],
+                    "capital": balance, "grid": grid, "intrabar": intrabar, "depth": depth, "profile": profile,
+                    "source": "recorded" if source == "本地录制" else "exchange"
+                }
+                cached = None
+                if not grid and not profile:
+                    # 相同数据区间 / 策略源码 / 参数的结果直接取缓存, 不下载不重算
+                    # 只按文件内容取哈希, 准入检查留给 worker, 按钮不阻塞
+                    strat_hash = file_hash(os.path.join(STRATEGY_DIR, selected_strat))
+                    data_fp = range_fingerprint(symbol, timeframe, limit, expected_end_ms(timeframe))
+                    cached = result_cache.get(cache_key(payload, {}, strat_hash, data_fp), selected_strat, strat_hash)
+                if cached is not None:
+                    st.session_state['bt_result'] = cached
+                    st.toast("⚡ 命中回测结果缓存")
                 else:
-                    status.update(label="数据获取失败", state="error")
-    
+                    # 提交到后台任务队列, 由 worker 进程执行 (python -m core.job_worker)
+                    job_id = job_queue.submit('sweep' if grid else 'backtest', payload)
+                    st.toast(f"任务 #{job_id} 已提交")
+
+    # 后台任务
+    st.subheader("🗂️ 回测任务")
+    if st.button("🔄 刷新任务"):
+        st.rerun()
+    for job in job_queue.list_jobs(10):
+        p = job['payload']
+        with st.expander(f"#{job['id']} {p['symbol']} {p['timeframe']} · {p['strategy']} · {job['status']}", expanded=job['status'] == 'running'):
+            st.progress(min(job['progress'] or 0, 1.0), text=job['message'] or job['status'])
+            results = job_queue.get_results(job['id'])
+            if results:
+                st.dataframe(pd.DataFrame([{**r['params'], **r['summary']} for r in results]), use_container_width=True)
+            b1, b2, b3 = st.columns(3)
+            if job['status'] in ('queued', 'running') and b1.button("⏹ 取消", key=f"cancel_{job['id']}"):
+                job_queue.cancel(job['id'])
+                st.rerun()
+            if job['status'] in ('cancelled', 'failed') and b2.button("⏯ 续跑", key=f"resume_{job['id']}"):
+                job_queue.resume(job['id'])
+                st.rerun()
+            if results:
+                labels = [json.dumps(r['params'], ensure_ascii=False) for r in results]
+                pick = b3.selectbox("查看结果", range(len(results)), format_func=lambda k: labels[k], key=f"pick_{job['id']}")
+                if b3.button("📊 展示", key=f"show_{job['id']}"):
+                    st.session_state['bt_result'] = pd.read_pickle(results[pick]['path'])
+            if p.get('profile'):
+                job_dir = os.path.join(job_queue.job_dir, str(job['id']))
+                for name in sorted(os.listdir(job_dir)) if os.path.isdir(job_dir) else []:
+                    if name.endswith(('.collapsed', '.txt', '.prof')):
+                        with open(os.path.join(job_dir, name), 'rb') as f:
+                            st.download_button(f"⬇️ {name}", f.read(), file_name=name, key=f"prof_{job['id']}_{name}")
+
     # 结果展示区
     if 'bt_result' in st.session_state:
         res = st.session_state['bt_result']
@@ -168,10 +237,23 @@ elif nav == "🧪 回测实验室 (Backtest)":
             # 资金曲线图
             st.subheader("💸 资金权益曲线")
             equity_df = res['equity']
+            trades_df = res['trades']
+            # 缩放: 只对可视区间降采样, 区间越小细节越多; 成交点始终保留
+            t_min, t_max = equity_df['time'].iloc[0].to_pydatetime(), equity_df['time'].iloc[-1].to_pydatetime()
+            if t_min < t_max:
+                view = st.slider("可视区间", min_value=t_min, max_value=t_max, value=(t_min, t_max), format="YYYY-MM-DD HH:mm")
+                equity_df = visible_window(equity_df, *view)
+            exits = trades_df[trades_df['exit_time'].between(equity_df['time'].iloc[0], equity_df['time'].iloc[-1])] if len(equity_df) else trades_df.iloc[0:0]
+            line = downsample_line(equity_df, 'equity', keep_times=exits['exit_time'])
             fig = go.Figure()
-            fig.add_trace(go.Scatter(x=equity_df['time'], y=equity_df['equity'], mode='lines', name='权益', line=dict(color='#00ff88')))
+            fig.add_trace(go.Scatter(x=line['time'], y=line['equity'], mode='lines', name='权益', line=dict(color='#00ff88')))
+            marks = equity_df.set_index('time')['equity'].reindex(exits['exit_time'], method='nearest') if len(exits) else None
+            if marks is not None:
+                fig.add_trace(go.Scatter(x=marks.index, y=marks.values, mode='markers', name='平仓',
+                                         marker=dict(size=6, color=['#00ff88' if p > 0 else '#ff5252' for p in exits['pnl']])))
             fig.update_layout(template='plotly_dark', height=400)
             st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"显示 {len(line)} / {len(equity_df)} 点")
             
             # 交易列表
             st.subheader("📋 交易日志")
@@ -234,12 +316,22 @@ elif nav == "🧠 策略工坊 (AI Studio)":
         
         if st.button("💾 保存到策略库"):
             if not file_name.endswith(".py"): file_name += ".py"
-            full_path = os.path.join(STRATEGY_DIR, file_name)
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(final_code)
-            st.toast(f"策略已保存至 {full_path}")
-            time.sleep(1)
-            st.rerun()
+            # 准入检查: 合成数据微基准 + 未来函数抽查, 不达标不入库
+            with st.spinner("正在验证策略性能..."):
+                report = get_registry().validate(final_code)
+            g1, g2, g3 = st.columns(3)
+            g1.metric("吞吐", f"{report['bars_per_sec']:,.0f} bars/s")
+            g2.metric("内存峰值", f"{report['peak_mb']:.1f} MB")
+            g3.metric("未来函数", "疑似" if report['lookahead'] else "未发现")
+            if not report['ok']:
+                st.error("策略未通过准入检查: " + "; ".join(report['errors']))
+            else:
+                full_path = os.path.join(STRATEGY_DIR, file_name)
+                with open(full_path, 'w', encoding='utf-8') as f:
+                    f.write(final_code)
+                st.toast(f"策略已保存至 {full_path}")
+                time.sleep(1)
+                st.rerun()
 
 # ==========================================
 #              4. 系统配置